@@ -1,11 +1,165 @@
+# src/agents/intent_router.py
+# Embedding intent router: the query vector (already computed by the semantic
+# cache stage) is compared with one centroid per intent from configs/intents.yaml.
+# Chit-chat / unsupported queries get a canned reply without retrieval or generation.
+
+import os
+import re
+import json
+import hashlib
+import threading
+from typing import Dict, Optional
+
+import numpy as np
+import yaml
+
+from agents.retrieval import embed_queries
+from models.registry import embedding_cache_key
+
+INTENTS_CONFIG = os.getenv("INTENTS_CONFIG", "configs/intents.yaml")
+INTENT_CENTROIDS = os.getenv("INTENT_CENTROIDS", "data/index/intent_centroids.npz")
+
+# Domain cues -> the `domain` values build_processed_chunks._detect_domain assigns.
+# Retrieval filters on the inferred domain, so it must be unambiguous: a
+# brand cue scores 2, a generic one 1, and the top domain needs at least
+# DOMAIN_MIN_SCORE and a DOMAIN_MARGIN lead ("my card was declined" is not
+# enough; "Wells Fargo card" or "checking account routing number" is).
+DOMAIN_KEYWORDS = {
+    "lucid": {
+        "brand": ["lucid", "dreamdrive", "lucid air", "lucid gravity"],
+        "generic": [
+            "air", "gravity", "vehicle", "car", "drive", "driving", "charging", "charger",
+            "battery", "range", "tire", "tires", "bluetooth", "infotainment", "key fob",
+        ],
+    },
+    "wells": {
+        "brand": ["wells", "fargo", "wells fargo", "zelle"],
+        "generic": [
+            "bank", "banking", "account", "checking", "savings", "debit", "credit", "card",
+            "deposit", "routing", "loan", "mortgage", "transfer", "atm", "statement",
+        ],
+    },
+}
+DOMAIN_MIN_SCORE = int(os.getenv("DOMAIN_MIN_SCORE", "2"))
+DOMAIN_MARGIN = int(os.getenv("DOMAIN_MARGIN", "2"))
+
+
+def _cue_pattern(words):
+    # longest first, so "lucid air" is one brand hit rather than "lucid" + "air"
+    words = sorted(words, key=len, reverse=True)
+    return re.compile(r"\b(?:" + "|".join(re.escape(w) for w in words) + r")\b", re.IGNORECASE)
+
+
+_DOMAIN_PATTERNS = {
+    domain: (_cue_pattern(cues["brand"]), _cue_pattern(cues["generic"]))
+    for domain, cues in DOMAIN_KEYWORDS.items()
+}
+
+
+def infer_domain(query: str):
+    scores = {
+        domain: 2 * len(brand.findall(query)) + len(generic.findall(brand.sub(" ", query)))
+        for domain, (brand, generic) in _DOMAIN_PATTERNS.items()
+    }
+    ranked = sorted(scores.items(), key=lambda kv: kv[1], reverse=True)
+    top, score = ranked[0]
+    runner_up = ranked[1][1] if len(ranked) > 1 else 0
+    if score < DOMAIN_MIN_SCORE or score - runner_up < DOMAIN_MARGIN:
+        return None
+    return top
+
+
+# ---------- Intent centroids ----------
+class IntentCentroids:
+    """
+    Normalized per-intent centroids; classify() is one (k, dim) @ (dim,) product.
+    """
+
+    def __init__(self, names, matrix: np.ndarray, cfg: Dict):
+        self.names = list(names)
+        self.matrix = matrix
+        self.threshold = float(cfg.get("threshold", 0.0))
+        self.fallback = cfg.get("fallback", "retrieval_needed")
+        intents = cfg.get("intents") or {}
+        self.replies = {n: c.get("reply") for n, c in intents.items() if c.get("short_circuit")}
+
+    def classify(self, qvec: np.ndarray):
+        sims = self.matrix @ np.asarray(qvec, dtype=np.float32)
+        best = int(np.argmax(sims))
+        if sims[best] < self.threshold:
+            return self.fallback, float(sims[best])
+        return self.names[best], float(sims[best])
+
+
+def _signature(cfg: Dict) -> str:
+    raw = json.dumps([cfg, embedding_cache_key()], sort_keys=True)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def build_centroids(cfg: Dict, path: str = INTENT_CENTROIDS) -> IntentCentroids:
+    names = list(cfg["intents"])
+    rows = []
+    for name in names:
+        vecs = embed_queries(cfg["intents"][name]["examples"])
+        mean = vecs.mean(axis=0)
+        rows.append(mean / max(np.linalg.norm(mean), 1e-12))
+    matrix = np.stack(rows).astype(np.float32)
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    tmp = path + ".tmp.npz"
+    np.savez(tmp, names=np.array(names), matrix=matrix, signature=np.array(_signature(cfg)))
+    os.replace(tmp, path)
+    print(f"[OK] Built {len(names)} intent centroids -> {path}")
+    return IntentCentroids(names, matrix, cfg)
+
+
+_centroids: Optional[IntentCentroids] = None
+_centroids_lock = threading.Lock()
+
+
+def load_centroids() -> IntentCentroids:
+    """
+    Centroids from disk, loaded once per process; rebuilt (one embedding
+    batch) when the file is missing or was built from other examples/model.
+    """
+    global _centroids
+    if _centroids is not None:
+        return _centroids
+    with _centroids_lock:
+        if _centroids is None:
+            with open(INTENTS_CONFIG, "r", encoding="utf-8") as f:
+                cfg = yaml.safe_load(f) or {}
+            if os.path.exists(INTENT_CENTROIDS):
+                data = np.load(INTENT_CENTROIDS)
+                if str(data["signature"]) == _signature(cfg):
+                    _centroids = IntentCentroids(data["names"].tolist(), data["matrix"], cfg)
+            if _centroids is None:
+                _centroids = build_centroids(cfg, INTENT_CENTROIDS)
+        return _centroids
+
+
+# ---------- Graph nodes ----------
 def intent_router_agent(state: dict) -> dict:
     query = state["query"]
+    # the semantic cache stage already embedded the query; only encode if it didn't run
+    qvec = state.get("query_vector")
+    if qvec is None:
+        qvec = embed_queries([query])[0].tolist()
+
+    intent, confidence = load_centroids().classify(qvec)
+
+    return {
+        "intent": intent,
+        "intent_confidence": confidence,
+        "query": query,
+        "query_vector": qvec,
+        "domain": infer_domain(query),
+    }
+
+
+def short_circuit_agent(state: dict) -> dict:
+    reply = load_centroids().replies.get(state.get("intent"))
+    return {"final_answer": reply, "retrieved_docs": []}
 
-    if "how to" in query.lower():
-        intent = "procedural"
-    elif "error" in query.lower():
-        intent = "troubleshooting"
-    else:
-        intent = "retrieval_needed"
 
-    return {"intent": intent, "query": query}
+def route_after_intent(state: dict) -> str:
+    return "respond" if state.get("intent") in load_centroids().replies else "continue"
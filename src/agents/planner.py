@@ -1,6 +1,15 @@
+import re
+
+# "compare X with/and/vs/to Y" -> X, Y
+_COMPARE = re.compile(r"\bcompare\b", re.IGNORECASE)
+_SIDES = re.compile(r"\b(?:with|and|vs\.?|versus|to)\b", re.IGNORECASE)
+
+
 def planner_agent(state: dict) -> dict:
     query = state["query"]
-    if state["intent"] == "retrieval_needed" and "compare" in query.lower():
-        sub_queries = query.split("compare")
+    if state["intent"] == "retrieval_needed" and _COMPARE.search(query):
+        rest = _COMPARE.split(query, maxsplit=1)[1]
+        sides = [s.strip(" ?.,") for s in _SIDES.split(rest)]
+        sub_queries = [query] + [s for s in sides if s]
         return {"sub_queries": sub_queries, "query": query}
     return {"sub_queries": [query], "query": query}
@@ -0,0 +1,128 @@
+# src/agents/rerank.py
+# Cross-encoder rerank stage with a per-passage token cap, a score cache
+# and an adaptive mode that skips/shrinks reranking when first-stage scores
+# already separate the candidates.
+
+import os
+import hashlib
+import operator
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Tuple
+
+from models.reranker import reranker_batcher
+from models.registry import model_cfg
+
+# "full" (always rerank the whole pool), "adaptive" or "off"
+RERANK_MODE = os.getenv("RERANK_MODE", "adaptive")
+# passages are pre-trimmed to this many words; the model itself truncates
+# query + passage to `max_length` tokens (configs/models.yaml)
+RERANK_MAX_TOKENS = int(os.getenv("RERANK_MAX_TOKENS", str(model_cfg("reranker")["max_length"])))
+RERANK_CACHE_SIZE = int(os.getenv("RERANK_CACHE_SIZE", "4096"))
+# adaptive thresholds are fractions of the candidates' first-stage score range
+# (min-max normalized), so they mean the same for hybrid [0,1], vector
+# 1 - distance and unbounded BM25 scores
+# skip reranking when top-1 leads top-2 by this much
+RERANK_SKIP_MARGIN = float(os.getenv("RERANK_SKIP_MARGIN", "0.3"))
+# only rerank candidates within this distance of the top score
+RERANK_WINDOW = float(os.getenv("RERANK_WINDOW", "0.4"))
+
+
+class ScoreCache:
+    """
+    Thread-safe LRU of (query_hash, chunk_id) -> cross-encoder score.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Tuple[str, str], float]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                return None
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, score: float):
+        with self._lock:
+            self._data[key] = score
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+
+score_cache = ScoreCache(RERANK_CACHE_SIZE)
+
+
+def _query_hash(query: str) -> str:
+    return hashlib.sha1(query.strip().lower().encode("utf-8")).hexdigest()
+
+
+def _truncate(text: str, max_tokens: int) -> str:
+    # every word is at least one wordpiece, so keeping max_tokens words never
+    # drops text the tokenizer would have kept; it just saves tokenizing the rest
+    words = text.split()
+    return text if len(words) <= max_tokens else " ".join(words[:max_tokens])
+
+
+def _select_pool(candidates: List[Dict], top_k: int) -> Tuple[List[Dict], bool]:
+    """
+    Adaptive pool: returns (candidates to rerank, skipped).
+    """
+    if RERANK_MODE == "off":
+        return [], True
+    # with two candidates min-max always puts them a full range apart
+    if RERANK_MODE != "adaptive" or len(candidates) <= 2:
+        return candidates, False
+    ranked = sorted(candidates, key=operator.itemgetter("retrieval_score"), reverse=True)
+    top, bottom = ranked[0]["retrieval_score"], ranked[-1]["retrieval_score"]
+    if top == bottom:
+        return ranked, False
+    gaps = [(top - c["retrieval_score"]) / (top - bottom) for c in ranked]
+    if gaps[1] >= RERANK_SKIP_MARGIN:
+        return [], True
+    pool = [c for c, gap in zip(ranked, gaps) if gap <= RERANK_WINDOW]
+    return ranked[:max(len(pool), top_k)], False
+
+
+def rerank(candidates: List[Dict], top_k: int) -> Tuple[List[Dict], Dict]:
+    """
+    Score candidates (each carrying "sub_queries" and "retrieval_score") and
+    return (top_k candidates with "score", stats). A chunk keeps its best
+    score across the sub-queries that found it. Candidates left out of the
+    rerank pool rank below every reranked one, by first-stage score.
+    """
+    pool, skipped = _select_pool(candidates, top_k)
+    stats = {"pool": len(pool), "candidates": len(candidates), "skipped": skipped, "cache_hits": 0, "scored": 0}
+
+    pairs, keys, owners = [], [], []
+    for c in candidates:
+        c["score"] = float("-inf")
+    for c in pool:
+        for sub_query in c["sub_queries"]:
+            key = (_query_hash(sub_query), c["doc_id"])
+            cached = score_cache.get(key)
+            if cached is not None:
+                stats["cache_hits"] += 1
+                c["score"] = max(c["score"], cached)
+                continue
+            pairs.append((sub_query, _truncate(c["text"], RERANK_MAX_TOKENS)))
+            keys.append(key)
+            owners.append(c)
+
+    if pairs:
+        scores = reranker_batcher(pairs)
+        stats["scored"] = len(pairs)
+        for key, c, score in zip(keys, owners, scores):
+            score_cache.put(key, float(score))
+            c["score"] = max(c["score"], float(score))
+
+    in_pool = {id(c) for c in pool}
+    for c in candidates:
+        c.pop("sub_queries", None)
+        if id(c) not in in_pool:
+            c["score"] = c["retrieval_score"]
+    ranked = sorted(candidates, key=lambda c: (id(c) in in_pool, c["score"]), reverse=True)
+    return ranked[:top_k], stats
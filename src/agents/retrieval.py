@@ -1,42 +1,225 @@
-from models.reranker import cross_encoder
-from models.embeddings import embedding_model
-from utils.weaviate_client import client
-import operator
+from models.embedding import embedding_batcher
+from agents.rerank import rerank
+from utils.weaviate_client import get_client, get_async_client
+from utils.embedding_cache import LRUEmbeddingCache
+from utils.concurrency import run_blocking
+from weaviate.classes.query import Filter, HybridFusion, MetadataQuery
+from concurrent.futures import ThreadPoolExecutor
+import asyncio
+import os
+import numpy as np
+import time
 
 CLASS_NAME = "DocChunk"
 
+# "hybrid" (BM25 + vector fusion), "vector" or "bm25"
+RETRIEVAL_MODE = os.getenv("RETRIEVAL_MODE", "hybrid")
+# 0.0 = pure BM25, 1.0 = pure vector
+HYBRID_ALPHA = float(os.getenv("HYBRID_ALPHA", "0.5"))
+# First-stage candidate depth per mode; this is also the rerank pool size.
+# Hybrid recall is better, so it can feed the cross-encoder a smaller pool.
+CANDIDATE_LIMITS = {
+    "vector": int(os.getenv("VECTOR_LIMIT", "20")),
+    "bm25":   int(os.getenv("BM25_LIMIT", "20")),
+    "hybrid": int(os.getenv("HYBRID_LIMIT", "12")),
+}
+QUERY_PROPERTIES = ["title^2", "section", "text"]
+TOP_K = 5
+MAX_PARALLEL_SEARCHES = int(os.getenv("MAX_PARALLEL_SEARCHES", "4"))
+# push the router's domain down as a Weaviate filter (falls back to unfiltered on no hits)
+DOMAIN_FILTER = os.getenv("DOMAIN_FILTER", "1") == "1"
+# must match the indexer: "1" = one tenant per domain instead of a shared collection
+DOMAIN_TENANTS = os.getenv("DOMAIN_TENANTS", "0") == "1"
+TENANTS = ["lucid", "wells", "unknown"]
+# recent query vectors kept in memory (the on-disk cache is the indexer's)
+QUERY_CACHE_SIZE = int(os.getenv("QUERY_CACHE_SIZE", "4096"))
+
+query_cache = LRUEmbeddingCache(QUERY_CACHE_SIZE)
+_search_pool = ThreadPoolExecutor(max_workers=MAX_PARALLEL_SEARCHES, thread_name_prefix="weaviate-search")
+
+
+def _encode(texts):
+    return np.stack(embedding_batcher(texts))
+
+
+def embed_queries(texts):
+    """
+    Normalized query vectors as an (n, dim) array, through the query LRU.
+    """
+    return query_cache.encode(list(texts), _encode)
+
+
+def _query_vectors(state: dict, sub_queries: list) -> list:
+    """
+    One vector per sub-query. The main query's vector (computed once by the
+    semantic cache / router stage) is reused; only extra sub-queries are encoded.
+    """
+    known = {}
+    if state.get("query_vector") is not None:
+        known[state["query"]] = state["query_vector"]
+    todo = [q for q in sub_queries if q not in known]
+    if todo:
+        known.update(zip(todo, (v.tolist() for v in embed_queries(todo))))
+    return [known[q] for q in sub_queries]
+
+
+def _targets(col, domain):
+    """
+    (collection handle, filter) pairs each sub-query is searched against.
+    """
+    if DOMAIN_TENANTS:
+        return [(col.with_tenant(t), None) for t in ([domain] if domain else TENANTS)]
+    if domain and DOMAIN_FILTER:
+        return [(col, Filter.by_property("domain").equal(domain))]
+    return [(col, None)]
+
+
+def _domain_passes(domain):
+    """
+    Domains to search in turn: the routed domain, then everything, but only
+    when _targets() actually scopes by domain (else both passes are the same).
+    """
+    if domain and (DOMAIN_FILTER or DOMAIN_TENANTS):
+        return [domain, None]
+    return [None]
+
+
+def _search_jobs(col, sub_queries, qvecs, domain):
+    return [(q, v, handle, flt) for q, v in zip(sub_queries, qvecs) for handle, flt in _targets(col, domain)]
+
+
+def _search(col, query: str, qvec, mode: str, filters=None):
+    # works for sync and async collections; the async client returns awaitables
+    limit = CANDIDATE_LIMITS[mode]
+    if mode == "vector":
+        return col.query.near_vector(
+            near_vector=qvec, limit=limit, filters=filters, return_metadata=MetadataQuery(distance=True)
+        )
+    if mode == "bm25":
+        return col.query.bm25(
+            query=query, limit=limit, query_properties=QUERY_PROPERTIES, filters=filters,
+            return_metadata=MetadataQuery(score=True),
+        )
+    if mode == "hybrid":
+        return col.query.hybrid(
+            query=query, vector=qvec, alpha=HYBRID_ALPHA, limit=limit,
+            fusion_type=HybridFusion.RELATIVE_SCORE, query_properties=QUERY_PROPERTIES,
+            filters=filters, return_metadata=MetadataQuery(score=True),
+        )
+    raise ValueError(f"Unknown RETRIEVAL_MODE: {mode}")
+
+
+def _first_stage_score(obj) -> float:
+    md = obj.metadata
+    if md.score is not None:
+        return float(md.score)
+    if md.distance is not None:
+        return 1.0 - float(md.distance)
+    return 0.0
+
+
+def _sub_queries(state: dict) -> list:
+    subs = [q.strip() for q in (state.get("sub_queries") or []) if q and q.strip()]
+    # keep order, drop duplicates; fall back to the main query
+    return list(dict.fromkeys(subs)) or [state["query"]]
+
+
+def _merge_candidates(sub_queries: list, responses: list) -> list:
+    """
+    Dedup hits across sub-queries by chunk_id, remembering every sub-query
+    that retrieved a chunk (each one is scored by the cross-encoder).
+    """
+    merged = {}
+    for sub_query, response in zip(sub_queries, responses):
+        for r in response.objects:
+            doc_id = r.properties.get("chunk_id")
+            score = _first_stage_score(r)
+            cand = merged.get(doc_id)
+            if cand is None:
+                merged[doc_id] = cand = {
+                    "doc_id": doc_id,
+                    "text": r.properties.get("text", ""),
+                    "title": r.properties.get("title", ""),
+                    "domain": r.properties.get("domain"),
+                    "retrieval_score": score,
+                    "sub_queries": [],
+                }
+            cand["retrieval_score"] = max(cand["retrieval_score"], score)
+            cand["sub_queries"].append(sub_query)
+    return list(merged.values())
+
+
 def hybrid_retrieval_agent(state: dict) -> dict:
     query = state["query"]
+    mode = RETRIEVAL_MODE
+    sub_queries = _sub_queries(state)
+    timings = {}
 
-    # Encode query to vector
-    qvec = embedding_model.encode(
-        [query], normalize_embeddings=True, convert_to_numpy=True
-    )[0].tolist()
-
-    # Query Weaviate collection
-    col = client.collections.get(CLASS_NAME)
-    response = col.query.near_vector(near_vector=qvec, limit=20)
+    # Encode the sub-queries not embedded yet in one batch (BM25-only search doesn't need vectors)
+    t0 = time.perf_counter()
+    if mode == "bm25":
+        qvecs = [None] * len(sub_queries)
+    else:
+        qvecs = _query_vectors(state, sub_queries)
+    timings["embed_ms"] = (time.perf_counter() - t0) * 1000
 
-    candidates = [
-        {
-            "doc_id": r.properties.get("chunk_id"),
-            "text": r.properties.get("text", ""),
-            "title": r.properties.get("title", ""),
-        }
-        for r in response.objects
-    ]
+    # Query Weaviate, one search per sub-query (and tenant), concurrently;
+    # scoped to the routed domain, widened to everything if that finds nothing
+    t0 = time.perf_counter()
+    col = get_client().collections.get(CLASS_NAME)
+    candidates = []
+    for domain in _domain_passes(state.get("domain")):
+        jobs = _search_jobs(col, sub_queries, qvecs, domain)
+        responses = list(_search_pool.map(lambda j: _search(j[2], j[0], j[1], mode, j[3]), jobs))
+        candidates = _merge_candidates([j[0] for j in jobs], responses)
+        if candidates:
+            break
+    timings["search_ms"] = (time.perf_counter() - t0) * 1000
 
     if not candidates:
-        return {"retrieved_docs": [], "query": query}
+        return {"retrieved_docs": [], "query": query, "timings": timings}
 
-    # Rerank with cross-encoder
-    pairs = [(query, r["text"]) for r in candidates]
-    scores = cross_encoder.predict(pairs)
+    # Rerank every (sub-query, chunk) pair in a single cross-encoder batch
+    t0 = time.perf_counter()
+    top_k, rerank_stats = rerank(candidates, TOP_K)
+    timings["rerank_ms"] = (time.perf_counter() - t0) * 1000
 
-    for i, r in enumerate(candidates):
-        r["score"] = float(scores[i])
+    return {"retrieved_docs": top_k, "query": query, "timings": timings, "rerank_stats": rerank_stats}
+
+
+async def ahybrid_retrieval_agent(state: dict) -> dict:
+    """
+    Async twin of hybrid_retrieval_agent for graph.ainvoke: model calls run on
+    the model executor and Weaviate searches go through the async client.
+    """
+    query = state["query"]
+    mode = RETRIEVAL_MODE
+    sub_queries = _sub_queries(state)
+    timings = {}
+
+    t0 = time.perf_counter()
+    if mode == "bm25":
+        qvecs = [None] * len(sub_queries)
+    else:
+        qvecs = await run_blocking(_query_vectors, state, sub_queries)
+    timings["embed_ms"] = (time.perf_counter() - t0) * 1000
+
+    t0 = time.perf_counter()
+    col = (await get_async_client()).collections.get(CLASS_NAME)
+    candidates = []
+    for domain in _domain_passes(state.get("domain")):
+        jobs = _search_jobs(col, sub_queries, qvecs, domain)
+        responses = await asyncio.gather(*(_search(h, q, v, mode, flt) for q, v, h, flt in jobs))
+        candidates = _merge_candidates([j[0] for j in jobs], responses)
+        if candidates:
+            break
+    timings["search_ms"] = (time.perf_counter() - t0) * 1000
+
+    if not candidates:
+        return {"retrieved_docs": [], "query": query, "timings": timings}
 
-    reranked = sorted(candidates, key=operator.itemgetter("score"), reverse=True)
-    top_k = reranked[:5]
+    t0 = time.perf_counter()
+    top_k, rerank_stats = await run_blocking(rerank, candidates, TOP_K)
+    timings["rerank_ms"] = (time.perf_counter() - t0) * 1000
 
-    return {"retrieved_docs": top_k, "query": query}
+    return {"retrieved_docs": top_k, "query": query, "timings": timings, "rerank_stats": rerank_stats}
@@ -0,0 +1,156 @@
+# src/agents/semantic_cache.py
+# Semantic answer cache: near-duplicate questions reuse a previous final_answer.
+# Lookup runs right after the orchestrator; store runs after the validator.
+
+import os
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, List, Optional, Set
+
+import numpy as np
+
+from agents.retrieval import embed_queries
+from utils.concurrency import run_blocking
+
+SEMANTIC_CACHE_SIZE = int(os.getenv("SEMANTIC_CACHE_SIZE", "1024"))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", "3600"))       # seconds
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", "0.92"))  # cosine
+REINDEX_LOG = os.getenv("REINDEX_LOG", "data/index/reindexed_chunks.jsonl")
+
+
+class SemanticCache:
+    """
+    Bounded in-process index of normalized query vectors -> cached answers.
+    - lookup is one matrix-vector product over at most `capacity` rows
+    - LRU eviction on insert, TTL checked on lookup
+    - entries are dropped when any cited chunk_id shows up in the reindex log
+    """
+
+    def __init__(self, capacity: int, ttl: float, threshold: float, reindex_log: str = REINDEX_LOG):
+        self.capacity = capacity
+        self.ttl = ttl
+        self.threshold = threshold
+        self.reindex_log = reindex_log
+        self._vecs: Optional[np.ndarray] = None           # (capacity, dim), one slot per entry
+        self._entries: "OrderedDict[int, Dict]" = OrderedDict()  # slot -> entry, LRU order
+        self._by_chunk: Dict[str, Set[int]] = {}
+        self._free: List[int] = list(range(capacity))
+        self._log_offset = os.path.getsize(reindex_log) if os.path.exists(reindex_log) else 0
+        self._lock = threading.Lock()
+
+    # ---------- Internals (lock held) ----------
+    def _drop(self, slot: int):
+        entry = self._entries.pop(slot, None)
+        if entry is None:
+            return
+        for cid in entry["chunk_ids"]:
+            slots = self._by_chunk.get(cid)
+            if slots:
+                slots.discard(slot)
+                if not slots:
+                    del self._by_chunk[cid]
+        self._free.append(slot)
+
+    def _poll_reindex_log(self):
+        if not os.path.exists(self.reindex_log):
+            return
+        size = os.path.getsize(self.reindex_log)
+        if size < self._log_offset:  # log was rotated
+            self._log_offset = 0
+        if size == self._log_offset:
+            return
+        with open(self.reindex_log, "r", encoding="utf-8") as f:
+            f.seek(self._log_offset)
+            lines = f.readlines()
+            self._log_offset = f.tell()
+        for line in lines:
+            try:
+                rec = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if rec.get("full"):
+                for slot in list(self._entries):
+                    self._drop(slot)
+                continue
+            for cid in rec.get("chunk_ids", []):
+                for slot in list(self._by_chunk.get(cid, ())):
+                    self._drop(slot)
+
+    # ---------- Public API ----------
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def lookup(self, qvec: np.ndarray) -> Optional[Dict]:
+        with self._lock:
+            self._poll_reindex_log()
+            if not self._entries:
+                return None
+            now = time.time()
+            for slot in [s for s, e in self._entries.items() if now - e["created"] > self.ttl]:
+                self._drop(slot)
+            slots = list(self._entries)
+            if not slots:
+                return None
+            sims = self._vecs[slots] @ qvec
+            best = int(np.argmax(sims))
+            if sims[best] < self.threshold:
+                return None
+            slot = slots[best]
+            self._entries.move_to_end(slot)
+            return dict(self._entries[slot], similarity=float(sims[best]))
+
+    def put(self, qvec: np.ndarray, final_answer: str, retrieved_docs: List[Dict]):
+        with self._lock:
+            if self._vecs is None:
+                self._vecs = np.zeros((self.capacity, qvec.shape[0]), dtype=np.float32)
+            if not self._free:
+                self._drop(next(iter(self._entries)))  # least recently used
+            slot = self._free.pop()
+            chunk_ids = {d.get("doc_id") for d in retrieved_docs if d.get("doc_id")}
+            self._vecs[slot] = qvec
+            self._entries[slot] = {
+                "final_answer": final_answer,
+                "retrieved_docs": [dict(d) for d in retrieved_docs],
+                "chunk_ids": chunk_ids,
+                "created": time.time(),
+            }
+            for cid in chunk_ids:
+                self._by_chunk.setdefault(cid, set()).add(slot)
+
+
+semantic_cache = SemanticCache(SEMANTIC_CACHE_SIZE, SEMANTIC_CACHE_TTL, SEMANTIC_CACHE_THRESHOLD)
+
+
+def _lookup_result(qvec: np.ndarray, hit: Optional[Dict]) -> dict:
+    if hit is None:
+        return {"cache_hit": False, "query_vector": qvec.tolist()}
+    return {
+        "cache_hit": True,
+        "final_answer": hit["final_answer"],
+        "retrieved_docs": hit["retrieved_docs"],
+        "cache_similarity": hit["similarity"],
+    }
+
+
+def semantic_cache_agent(state: dict) -> dict:
+    qvec = embed_queries([state["query"]])[0]
+    return _lookup_result(qvec, semantic_cache.lookup(qvec))
+
+
+async def asemantic_cache_agent(state: dict) -> dict:
+    qvec = (await run_blocking(embed_queries, [state["query"]]))[0]
+    return _lookup_result(qvec, semantic_cache.lookup(qvec))
+
+
+def semantic_cache_store_agent(state: dict) -> dict:
+    final_answer = state.get("final_answer")
+    qvec = state.get("query_vector")
+    if final_answer and qvec is not None:
+        semantic_cache.put(np.asarray(qvec, dtype=np.float32), final_answer, state.get("retrieved_docs", []))
+    return {}
+
+
+def route_after_cache(state: dict) -> str:
+    return "hit" if state.get("cache_hit") else "miss"
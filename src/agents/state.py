@@ -0,0 +1,37 @@
+# src/agents/state.py
+# Graph state schema. Every key is its own LangGraph channel, so a node only
+# returns the keys it changes and everything else (query, query_vector,
+# domain, on_token, attempts, ...) flows through to later nodes untouched.
+# A key missing here is silently dropped from node updates: add new ones.
+
+from typing import Any, Callable, Dict, List, Optional, TypedDict
+
+
+class AgentState(TypedDict, total=False):
+    # input
+    query: str
+    on_token: Optional[Callable[[str], Any]]  # streaming callback (synthesizer)
+
+    # semantic cache
+    query_vector: List[float]
+    cache_hit: bool
+    cache_similarity: float
+
+    # router / planner
+    intent: str
+    intent_confidence: float
+    domain: Optional[str]
+    sub_queries: List[str]
+
+    # retrieval
+    retrieved_docs: List[Dict[str, Any]]
+    timings: Dict[str, float]
+    rerank_stats: Dict[str, Any]
+
+    # synthesizer / validator
+    answer: str
+    prompt: str
+    context_stats: Dict[str, Any]
+    attempts: int
+    final_answer: Optional[str]
+    error: Optional[str]
@@ -1,12 +1,16 @@
-from models.generator import generator
+import os
+from typing import Dict, List, Set, Tuple
 
-def synthesizer_agent(state: dict) -> dict:
-    docs = state.get("retrieved_docs", [])
-    query = state["query"]
+from models.generator import GEN_MAX_INPUT_TOKENS, generator_batcher, regenerate, stream_generate
+from models.registry import get_tokenizer
+from utils.concurrency import iterate_blocking, run_blocking
 
-    context = "\n".join([f"[{d['doc_id']}] {d['text']}" for d in docs])
+DEDUP_NGRAM = 8           # words per shingle when comparing chunk text
+DEDUP_THRESHOLD = 0.8     # drop a chunk when this share of its shingles is already in the context
+MIN_PARTIAL_TOKENS = 48   # smallest truncated chunk worth adding when the budget runs out
+CONTEXT_BUDGET = int(os.getenv("CONTEXT_BUDGET", str(GEN_MAX_INPUT_TOKENS)))
 
-    prompt = f"""
+PROMPT_TEMPLATE = """
     Answer the question using only the context below.
     Cite sources with [doc_id].
     If you cannot find the answer, say "Not enough information."
@@ -18,6 +22,128 @@ def synthesizer_agent(state: dict) -> dict:
     {query}
     """
 
-    output = generator(prompt, max_new_tokens=256)[0]["generated_text"]
 
-    return {"answer": output}
+# ---------- Context packing ----------
+def _token_spans(texts: List[str]) -> List[List[Tuple[int, int]]]:
+    """
+    Character span of every generator token in each text (one batched call).
+    """
+    enc = get_tokenizer("generator")(texts, add_special_tokens=False, return_offsets_mapping=True, verbose=False)
+    return enc["offset_mapping"]
+
+
+def _shingles(words: List[str]) -> Set[Tuple[str, ...]]:
+    n = min(DEDUP_NGRAM, len(words))
+    return {tuple(words[i:i + n]) for i in range(len(words) - n + 1)}
+
+
+def _dedup(docs: List[Dict]) -> List[Tuple[Dict, str]]:
+    """
+    Drop near-duplicate chunks and trim text a chunk shares with a higher-ranked
+    one (neighbouring chunks overlap by design). Returns (doc, text) in input order.
+    """
+    seen: Set[Tuple[str, ...]] = set()
+    out: List[Tuple[Dict, str]] = []
+    for d in docs:
+        words = (d.get("text") or "").split()
+        if not words:
+            continue
+        sh = _shingles(words)
+        if seen and len(sh & seen) / len(sh) >= DEDUP_THRESHOLD:
+            continue
+        while len(words) > DEDUP_NGRAM and tuple(words[:DEDUP_NGRAM]) in seen:
+            words = words[1:]
+        while len(words) > DEDUP_NGRAM and tuple(words[-DEDUP_NGRAM:]) in seen:
+            words = words[:-1]
+        seen |= sh
+        out.append((d, " ".join(words)))
+    return out
+
+
+def pack_context(query: str, docs: List[Dict], budget: int = CONTEXT_BUDGET) -> Tuple[str, Dict]:
+    """
+    Fit the highest-scoring chunks into the generator's input budget (measured
+    with its tokenizer, prompt template and question included). Returns
+    (context, stats); chunks past the budget are dropped instead of being
+    silently truncated by the model.
+    """
+    ranked = sorted(docs, key=lambda d: d.get("score", d.get("retrieval_score", 0.0)), reverse=True)
+    kept = _dedup(ranked)
+    pieces = [f"[{d['doc_id']}] {text}" for d, text in kept]
+    overhead = PROMPT_TEMPLATE.format(context="", query=query)
+
+    spans = _token_spans([overhead] + pieces)
+    remaining = budget - len(spans[0]) - 1  # </s>
+    context: List[str] = []
+    used: List[str] = []
+    for (d, _), piece, piece_spans in zip(kept, pieces, spans[1:]):
+        n = len(piece_spans) + 1  # joining newline
+        if n <= remaining:
+            context.append(piece)
+            used.append(d["doc_id"])
+            remaining -= n
+        elif remaining >= MIN_PARTIAL_TOKENS:
+            context.append(piece[:piece_spans[remaining - 2][1]])
+            used.append(d["doc_id"])
+            remaining = 0
+    stats = {
+        "candidates": len(docs),
+        "duplicates": len(docs) - len(kept),
+        "packed": len(used),
+        "tokens": budget - remaining,
+    }
+    return "\n".join(context), {**stats, "doc_ids": used}
+
+
+def build_prompt(state: dict) -> Tuple[str, Dict]:
+    context, stats = pack_context(state["query"], state.get("retrieved_docs", []))
+    return PROMPT_TEMPLATE.format(context=context, query=state["query"]), stats
+
+
+# ---------- Generation ----------
+def _generate(prompt: str) -> str:
+    return generator_batcher([prompt])[0]
+
+
+def synthesizer_agent(state: dict) -> dict:
+    """
+    With a callable `on_token` in the state, the answer is streamed to it
+    piece by piece as it is generated; otherwise it goes through the batcher.
+    A validator retry regenerates on the same prompt (not streamed), reusing
+    the generator's cached encoder states.
+    """
+    attempts = state.get("attempts", 0)
+    if attempts and state.get("prompt"):
+        return {"answer": regenerate(state["prompt"]), "attempts": attempts + 1}
+
+    prompt, stats = build_prompt(state)
+    on_token = state.get("on_token")
+    if on_token is None:
+        output = _generate(prompt)
+    else:
+        pieces = []
+        for piece in stream_generate(prompt):
+            on_token(piece)
+            pieces.append(piece)
+        output = "".join(pieces)
+
+    return {"answer": output, "context_stats": stats, "prompt": prompt, "attempts": 1}
+
+
+async def asynthesizer_agent(state: dict) -> dict:
+    attempts = state.get("attempts", 0)
+    if attempts and state.get("prompt"):
+        return {"answer": await run_blocking(regenerate, state["prompt"]), "attempts": attempts + 1}
+
+    prompt, stats = build_prompt(state)
+    on_token = state.get("on_token")
+    if on_token is None:
+        output = await run_blocking(_generate, prompt)
+    else:
+        pieces = []
+        async for piece in iterate_blocking(stream_generate, prompt):
+            on_token(piece)
+            pieces.append(piece)
+        output = "".join(pieces)
+
+    return {"answer": output, "context_stats": stats, "prompt": prompt, "attempts": 1}
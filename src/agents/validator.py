@@ -4,4 +4,14 @@ def validator_agent(state: dict) -> dict:
     if not answer or "[" not in answer:
         return {"final_answer": None, "error": "Ungrounded or empty answer"}
 
-    return {"final_answer": answer}
+    return {"final_answer": answer, "error": None}
+
+
+# one regeneration (same context, retry decoding profile) before giving up
+GEN_MAX_RETRIES = 1
+
+
+def route_after_validation(state: dict) -> str:
+    if state.get("error") and state.get("attempts", 1) <= GEN_MAX_RETRIES:
+        return "retry"
+    return "done"
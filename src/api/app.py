@@ -0,0 +1,120 @@
+# src/api/app.py
+# FastAPI front end for the async LangGraph pipeline.
+# Run from the repo root:  uvicorn api.app:app --app-dir src --port 8000
+
+import os
+import json
+import asyncio
+from contextlib import asynccontextmanager
+from typing import Any, Dict, List, Optional
+
+from fastapi import FastAPI
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel
+
+from main import build_graph
+from agents.intent_router import load_centroids
+from models.batching import batcher_stats
+from models.generator import engine as generation_engine
+from models.registry import preload
+from utils.concurrency import run_blocking
+from utils.weaviate_client import close_async_client
+
+
+class AskRequest(BaseModel):
+    query: str
+    # stream=True answers with NDJSON: {"token": ...} lines as the answer is
+    # generated, then one {"done": AskResponse} line
+    stream: bool = False
+
+
+class Source(BaseModel):
+    doc_id: Optional[str] = None
+    title: Optional[str] = None
+    score: Optional[float] = None
+
+
+class AskResponse(BaseModel):
+    query: str
+    answer: Optional[str] = None
+    error: Optional[str] = None
+    cache_hit: bool = False
+    sources: List[Source] = []
+    timings: Dict[str, float] = {}
+
+
+def _to_response(query: str, result: Dict[str, Any]) -> AskResponse:
+    return AskResponse(
+        query=query,
+        answer=result.get("final_answer"),
+        error=result.get("error"),
+        cache_hit=bool(result.get("cache_hit")),
+        sources=[
+            Source(doc_id=d.get("doc_id"), title=d.get("title"), score=d.get("score"))
+            for d in result.get("retrieved_docs", [])
+        ],
+        timings=result.get("timings", {}),
+    )
+
+
+# "1" loads and warms every model at startup instead of on the first /ask
+PRELOAD_MODELS = os.getenv("PRELOAD_MODELS", "1") == "1"
+
+
+def create_app(graph=None, preload_models: bool = PRELOAD_MODELS) -> FastAPI:
+    """
+    Build the app around a compiled async graph. Pass `graph` to serve a
+    custom one; for a stubbed Weaviate, inject the stub client with
+    utils.weaviate_client.set_async_client() before the first request.
+    """
+    @asynccontextmanager
+    async def lifespan(app: FastAPI):
+        app.state.graph = graph or build_graph(async_mode=True)
+        if preload_models:
+            await run_blocking(preload)
+            await run_blocking(load_centroids)
+        yield
+        await close_async_client()
+
+    app = FastAPI(title="Agentic RAG", lifespan=lifespan)
+
+    @app.get("/healthz")
+    async def healthz() -> Dict[str, str]:
+        return {"status": "ok"}
+
+    @app.get("/metrics")
+    async def metrics() -> Dict[str, Any]:
+        # queue depth / batch occupancy per model batcher; generation tokens/sec + bucket occupancy
+        return {"batchers": batcher_stats(), "generation": generation_engine.stats()}
+
+    async def _stream(query: str):
+        tokens: asyncio.Queue = asyncio.Queue()
+        done = object()
+
+        async def run():
+            try:
+                # the synthesizer calls on_token on the event loop for every generated piece
+                return await app.state.graph.ainvoke({"query": query, "on_token": tokens.put_nowait})
+            finally:
+                tokens.put_nowait(done)
+
+        task = asyncio.create_task(run())
+        while True:
+            piece = await tokens.get()
+            if piece is done:
+                break
+            yield json.dumps({"token": piece}) + "\n"
+        result = await task
+        yield json.dumps({"done": _to_response(query, result).model_dump()}) + "\n"
+
+    @app.post("/ask", response_model=AskResponse)
+    async def ask(req: AskRequest):
+        if req.stream:
+            return StreamingResponse(_stream(req.query), media_type="application/x-ndjson")
+        result = await app.state.graph.ainvoke({"query": req.query})
+        return _to_response(req.query, result)
+
+    return app
+
+
+app = create_app()
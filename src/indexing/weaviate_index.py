@@ -1,20 +1,41 @@
 # src/indexing/weaviate_index.py
-import os, json, warnings
-from typing import List, Dict
+import os, json, time, queue, hashlib, threading, warnings
+from typing import Dict, Iterable, Iterator, List, Optional, Set
 import weaviate
-from weaviate.classes.config import Property, DataType, Configure
+from weaviate.classes.config import Property, DataType, Configure, Tokenization
+from weaviate.classes.query import Filter
+from weaviate.classes.tenants import Tenant
 from weaviate.collections.classes.data import DataObject
-from sentence_transformers import SentenceTransformer
+from weaviate.util import generate_uuid5
+
+from src.models.registry import embedding_cache_key, get_model, model_id
+from src.utils.embedding_cache import EmbeddingCache
+from src.utils.chunk_store import CHUNK_STORE_PATH, HAS_ARROW, count_rows, iter_batches, take_rows
 
 # Quiet CPU warnings
 warnings.filterwarnings("ignore", message=".*pin_memory.*")
 os.environ["TOKENIZERS_PARALLELISM"] = "false"
 
 WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://localhost:8080")
-CHUNKS_PATH  = os.getenv("CHUNKS_PATH", "data/processed/chunks/all_chunks.jsonl")
+CHUNKS_PATH  = os.getenv("CHUNKS_PATH", "data/processed/chunks/all_chunks.jsonl")  # used when no chunk store
 CLASS_NAME   = os.getenv("WEAVIATE_CLASS", "DocChunk")
 BATCH_SIZE   = int(os.getenv("BATCH_SIZE", "64"))
-EMB_MODEL_ID = os.getenv("EMB_MODEL_ID", "all-MiniLM-L6-v2")   # light + fast
+EMB_MODEL_ID = model_id("embedding")   # configs/models.yaml (EMB_MODEL_ID env still overrides)
+ENCODE_BATCH_SIZE = int(os.getenv("ENCODE_BATCH_SIZE", str(max(BATCH_SIZE, 128))))
+PIPELINE_DEPTH    = int(os.getenv("PIPELINE_DEPTH", "4"))      # batches buffered per stage
+# "incremental" (diff whole collection) | "changeset" (diff only chunks the last build touched)
+# | "full" (drop + rebuild)
+INDEX_MODE   = os.getenv("INDEX_MODE", "incremental")
+CHANGESET_PATH = os.getenv("CHANGESET_PATH", "data/processed/chunks/changeset.json")
+# "1": one tenant per domain (multi-tenant collection) instead of one shared
+# collection filtered on `domain`; switching needs INDEX_MODE=full
+DOMAIN_TENANTS = os.getenv("DOMAIN_TENANTS", "0") == "1"
+TENANTS = ["lucid", "wells", "unknown"]  # build_processed_chunks._detect_domain values
+DELETE_BATCH = 1000
+# consumers (e.g. the semantic answer cache) tail this to drop stale entries
+REINDEX_LOG  = os.getenv("REINDEX_LOG", "data/index/reindexed_chunks.jsonl")
+
+_DONE = object()  # end-of-stream marker passed between pipeline stages
 
 
 def load_chunks(path: str) -> List[Dict]:
@@ -28,89 +49,405 @@ def load_chunks(path: str) -> List[Dict]:
     return rows
 
 
+def _schema_properties() -> List[Property]:
+    return [
+        # exact-match filter keys: whole-value tokens, filterable index, not in BM25
+        Property(name="chunk_id",    data_type=DataType.TEXT, tokenization=Tokenization.FIELD,
+                 index_filterable=True, index_searchable=False),
+        Property(name="text",        data_type=DataType.TEXT),
+        Property(name="domain",      data_type=DataType.TEXT, tokenization=Tokenization.FIELD,
+                 index_filterable=True, index_searchable=False),
+        Property(name="doc_type",    data_type=DataType.TEXT, tokenization=Tokenization.FIELD,
+                 index_filterable=True, index_searchable=False),
+        Property(name="source_url",  data_type=DataType.TEXT),
+        Property(name="file_path",   data_type=DataType.TEXT),
+        Property(name="section",     data_type=DataType.TEXT),
+        Property(name="title",       data_type=DataType.TEXT),
+        Property(name="sha256",      data_type=DataType.TEXT),
+        Property(name="raw_id",      data_type=DataType.TEXT),
+        Property(name="page_no",     data_type=DataType.INT),
+        Property(name="text_sha256", data_type=DataType.TEXT),
+    ]
+
+
 def ensure_schema(client: weaviate.WeaviateClient):
     existing = client.collections.list_all()
     if CLASS_NAME in existing:
-        return
-    client.collections.create(
-        name=CLASS_NAME,
-        properties=[
-            Property(name="chunk_id",   data_type=DataType.TEXT),
-            Property(name="text",       data_type=DataType.TEXT),
-            Property(name="domain",     data_type=DataType.TEXT),
-            Property(name="doc_type",   data_type=DataType.TEXT),
-            Property(name="source_url", data_type=DataType.TEXT),
-            Property(name="file_path",  data_type=DataType.TEXT),
-            Property(name="section",    data_type=DataType.TEXT),
-            Property(name="title",      data_type=DataType.TEXT),
-            Property(name="sha256",     data_type=DataType.TEXT),
-            Property(name="raw_id",     data_type=DataType.TEXT),
-            Property(name="page_no",    data_type=DataType.INT),
-        ],
-        vector_config=Configure.Vectorizer.none(),  # no auto-vectorizer
-    )
+        # older collections predate some properties; add them in place
+        col = client.collections.get(CLASS_NAME)
+        config = col.config.get()
+        if bool(config.multi_tenancy_config.enabled) != DOMAIN_TENANTS:
+            raise RuntimeError(
+                f"{CLASS_NAME} multi-tenancy does not match DOMAIN_TENANTS={int(DOMAIN_TENANTS)}; "
+                f"rebuild with INDEX_MODE=full"
+            )
+        have = {p.name: p for p in config.properties}
+        for prop in _schema_properties():
+            if prop.name not in have:
+                col.config.add_property(prop)
+        for name in ("chunk_id", "domain"):
+            if have.get(name) is not None and have[name].tokenization != Tokenization.FIELD:
+                print(f"[ERR] {CLASS_NAME}.{name} predates field tokenization; INDEX_MODE=full rebuilds it")
+    else:
+        client.collections.create(
+            name=CLASS_NAME,
+            properties=_schema_properties(),
+            vector_config=Configure.Vectorizer.none(),  # no auto-vectorizer
+            multi_tenancy_config=Configure.multi_tenancy(enabled=DOMAIN_TENANTS),
+        )
+    if DOMAIN_TENANTS:
+        col = client.collections.get(CLASS_NAME)
+        missing = [t for t in TENANTS if t not in col.tenants.get()]
+        if missing:
+            col.tenants.create([Tenant(name=t) for t in missing])
 
 
-def main():
-    # REST-only to avoid gRPC port issues locally
-    client = weaviate.connect_to_local(skip_init_checks=True)
+def text_sha256(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def object_uuid(props: Dict) -> str:
+    """
+    Deterministic object ID: same chunk_id + same text -> same UUID.
+    A changed chunk gets a new UUID, so "upsert" is insert-new + delete-stale.
+    """
+    return generate_uuid5(f"{props['chunk_id']}:{props['text_sha256']}")
+
+
+def build_props(r: Dict) -> Optional[Dict]:
+    text = (r.get("text") or "").strip()
+    if not text:
+        return None
+    return {
+        "chunk_id":   r.get("chunk_id"),
+        "text":       text,
+        "domain":     r.get("domain"),
+        "doc_type":   r.get("doc_type"),
+        "source_url": r.get("source_url"),
+        "file_path":  r.get("file_path"),
+        "section":    r.get("section"),
+        "title":      r.get("title"),
+        "sha256":     r.get("sha256"),
+        "raw_id":     r.get("raw_id"),
+        "page_no":    int(r.get("page_no") or 0),
+        "text_sha256": text_sha256(text),
+    }
+
+
+def iter_prop_batches(props_iter: Iterable[Dict], size: int) -> Iterator[List[Dict]]:
+    batch: List[Dict] = []
+    for props in props_iter:
+        batch.append(props)
+        if len(batch) >= size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def _stage(name: str, fn, inbox: "queue.Queue", outbox: Optional["queue.Queue"], errors: List):
+    """
+    Run `fn` on every item from `inbox` until the end marker arrives.
+    Results go to `outbox`; the end marker is always forwarded so downstream
+    stages shut down even if this one failed.
+    """
     try:
-        ensure_schema(client)
+        while True:
+            item = inbox.get()
+            if item is _DONE:
+                break
+            out = fn(item)
+            if outbox is not None:
+                outbox.put(out)
+    except Exception as e:  # surfaced by index_rows() after join
+        errors.append((name, e))
+        # drain so the producer never blocks on a full queue
+        while inbox.get() is not _DONE:
+            pass
+    finally:
+        if outbox is not None:
+            outbox.put(_DONE)
 
-        rows = load_chunks(CHUNKS_PATH)
-        if not rows:
-            print(f"[ERR] No rows in {CHUNKS_PATH}")
-            return
-        print(f"[OK] Loaded {len(rows)} chunks")
 
-        model = SentenceTransformer(EMB_MODEL_ID, device="cpu")
-        col = client.collections.get(CLASS_NAME)
+def index_rows(props_iter: Iterable[Dict], encode_texts, col):
+    """
+    Three-stage pipeline:
+      build props (caller thread) -> encode batch (encoder thread) -> insert_many (writer thread)
+    Bounded queues keep at most PIPELINE_DEPTH batches in flight per stage.
+    `encode_texts(texts, hashes)` returns an (n, dim) float32 array.
+    Returns (chunks written, chunk_ids whose insert failed). insert_many
+    reports per-object failures instead of raising; callers must keep the
+    old versions of failed chunks.
+    """
+    encode_q: "queue.Queue" = queue.Queue(maxsize=PIPELINE_DEPTH)
+    write_q: "queue.Queue" = queue.Queue(maxsize=PIPELINE_DEPTH)
+    errors: List = []
+    written = 0
+    failed: Set[str] = set()
 
-        batch_objs: List[Dict] = []
+    def encode(props_batch: List[Dict]):
+        vecs = encode_texts([p["text"] for p in props_batch], [p["text_sha256"] for p in props_batch])
+        return props_batch, vecs
 
-        def flush():
-            if not batch_objs:
-                return
+    def write(item) -> None:
+        nonlocal written
+        props_batch, vecs = item
+        n_failed = 0
+        for start in range(0, len(props_batch), BATCH_SIZE):
+            part = props_batch[start:start + BATCH_SIZE]
             objs = [
-                DataObject(properties=obj["properties"], vector=obj["vector"])
-                for obj in batch_objs
+                DataObject(properties=p, vector=v.tolist(), uuid=object_uuid(p))
+                for p, v in zip(part, vecs[start:start + BATCH_SIZE])
             ]
-            col.data.insert_many(objs)
-            batch_objs.clear()
+            res = col.data.insert_many(objs)
+            if res.has_errors:
+                failed.update(part[i]["chunk_id"] for i in res.errors)
+                n_failed += len(res.errors)
+                first = next(iter(res.errors.values()))
+                print(f"[ERR] {len(res.errors)} of {len(objs)} inserts failed: {getattr(first, 'message', first)}")
+        prev = written
+        written += len(props_batch) - n_failed
+        if written // 500 > prev // 500:
+            print(f"  upserted {written}...")
+
+    encoder = threading.Thread(target=_stage, args=("encode", encode, encode_q, write_q, errors), daemon=True)
+    writer = threading.Thread(target=_stage, args=("write", write, write_q, None, errors), daemon=True)
+    encoder.start()
+    writer.start()
+    try:
+        for batch in iter_prop_batches(props_iter, ENCODE_BATCH_SIZE):
+            if errors:
+                break
+            encode_q.put(batch)
+    finally:
+        encode_q.put(_DONE)
+        encoder.join()
+        writer.join()
+
+    if errors:
+        name, err = errors[0]
+        raise RuntimeError(f"indexing pipeline failed in {name} stage") from err
+    return written, failed
+
+
+def fetch_existing_ids(col, chunk_ids: Optional[List[str]] = None) -> Dict[str, str]:
+    """
+    UUID -> chunk_id for every object already stored (vectors not fetched).
+    With `chunk_ids`, only objects carrying one of those ids are fetched.
+    Collections built before chunk_id used field tokenization match on word
+    tokens ("www", "p0", ...), so hits are re-checked against the exact ids.
+    """
+    if chunk_ids is None:
+        return {str(obj.uuid): obj.properties.get("chunk_id") for obj in col.iterator(return_properties=["chunk_id"])}
+    found: Dict[str, str] = {}
+    for start in range(0, len(chunk_ids), DELETE_BATCH):
+        part = chunk_ids[start:start + DELETE_BATCH]
+        res = col.query.fetch_objects(
+            filters=Filter.by_property("chunk_id").contains_any(part),
+            return_properties=["chunk_id"],
+            limit=10000,  # Weaviate's default QUERY_MAXIMUM_RESULTS
+        )
+        wanted = set(part)
+        found.update({
+            str(obj.uuid): obj.properties.get("chunk_id")
+            for obj in res.objects if obj.properties.get("chunk_id") in wanted
+        })
+    return found
+
+
+def load_changeset(path: str) -> Optional[Dict]:
+    """
+    Chunk-level diff written by build_processed_chunks ({"added": [...], "removed": [...]}),
+    accumulated over every build since the last successful index run.
+    """
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return json.load(f)
 
-        for i, r in enumerate(rows, start=1):
-            text = (r.get("text") or "").strip()
+
+def clear_changeset(path: str, built_at: Optional[int]):
+    """
+    Mark the pending changeset as indexed; the next build starts a fresh one.
+    Left alone if a build rewrote it (new `built_at`) while the indexer ran.
+    """
+    current = load_changeset(path)
+    if current is None or current.get("built_at") != built_at:
+        return
+    with open(path + ".tmp", "w", encoding="utf-8") as f:
+        json.dump({"indexed_at": int(time.time()), "added": [], "removed": []}, f)
+    os.replace(path + ".tmp", path)
+
+
+def delete_ids(col, ids: List[str]) -> int:
+    deleted = 0
+    for start in range(0, len(ids), DELETE_BATCH):
+        part = ids[start:start + DELETE_BATCH]
+        res = col.data.delete_many(where=Filter.by_id().contains_any(part))
+        deleted += res.successful
+    return deleted
+
+
+def plan_incremental(rows: Iterable[Dict], existing: Dict[str, str]):
+    """
+    Diff the chunk manifest against the collection.
+    Returns (props to insert, stale UUIDs to delete, number unchanged).
+    Stale objects are changed chunks' old versions plus chunks whose
+    raw_id/sha256 no longer appear in the manifest.
+    """
+    wanted: Dict[str, Dict] = {}
+    for r in rows:
+        props = build_props(r)
+        if props is not None:
+            wanted.setdefault(object_uuid(props), props)
+    to_insert = [p for u, p in wanted.items() if u not in existing]
+    stale = sorted(existing.keys() - wanted.keys())
+    return to_insert, stale, len(wanted) - len(to_insert)
+
+
+def plan_from_store(path: str, existing: Dict[str, str], only_chunk_ids: Optional[Set[str]] = None,
+                    domain: Optional[str] = None):
+    """
+    plan_incremental over the columnar chunk store. The diff reads only the
+    chunk_id + text (+ domain) columns; full rows are materialized just for
+    the chunks that must be inserted.
+    """
+    wanted: Set[str] = set()
+    positions: List[int] = []
+    offset = 0
+    for batch in iter_batches(path, columns=["chunk_id", "text", "domain"]):
+        ids, texts, domains = (batch.column(i).to_pylist() for i in range(3))
+        for i, (cid, text, dom) in enumerate(zip(ids, texts, domains)):
+            if only_chunk_ids is not None and cid not in only_chunk_ids:
+                continue
+            if domain is not None and dom != domain:
+                continue
+            text = (text or "").strip()
             if not text:
                 continue
+            uuid = generate_uuid5(f"{cid}:{text_sha256(text)}")
+            if uuid in wanted:
+                continue
+            wanted.add(uuid)
+            if uuid not in existing:
+                positions.append(offset + i)
+        offset += batch.num_rows
+    to_insert = [build_props(r) for r in take_rows(path, positions)] if positions else []
+    stale = sorted(existing.keys() - wanted)
+    return to_insert, stale, len(wanted) - len(to_insert)
+
+
+def log_reindexed(chunk_ids: Set[str], full: bool):
+    if not chunk_ids and not full:
+        return
+    os.makedirs(os.path.dirname(REINDEX_LOG) or ".", exist_ok=True)
+    with open(REINDEX_LOG, "a", encoding="utf-8") as f:
+        rec = {"at": int(time.time()), "full": full, "chunk_ids": sorted(c for c in chunk_ids if c)}
+        f.write(json.dumps(rec, ensure_ascii=False) + "\n")
+
+
+def make_encoder(cache: EmbeddingCache):
+    """
+    Cache-first encoder. The registry only loads the embedding model on the
+    first cache miss, so rebuilding an index from cached vectors needs no inference.
+    """
+    def infer(texts: List[str]):
+        return get_model("embedding").encode(
+            texts, batch_size=ENCODE_BATCH_SIZE,
+            convert_to_numpy=True, normalize_embeddings=True,
+        )
+
+    def encode_texts(texts: List[str], hashes: List[str]):
+        return cache.encode(texts, infer, hashes=hashes)
+
+    return encode_texts
+
+
+def plan_target(handle, rows: Optional[List[Dict]], touched: Optional[Set[str]], domain: Optional[str] = None):
+    """
+    Diff one indexing target (the collection, or one domain tenant) against
+    the chunk manifest. Returns (existing, to_insert, stale, unchanged).
+    """
+    if touched is not None:
+        existing = fetch_existing_ids(handle, sorted(touched))
+    else:
+        existing = {} if INDEX_MODE == "full" else fetch_existing_ids(handle)
+    if rows is None:
+        return (existing, *plan_from_store(CHUNK_STORE_PATH, existing, touched, domain))
+    selected = [
+        r for r in rows
+        if (touched is None or r.get("chunk_id") in touched) and (domain is None or r.get("domain") == domain)
+    ]
+    return (existing, *plan_incremental(selected, existing))
+
+
+def main():
+    # REST-only to avoid gRPC port issues locally
+    client = weaviate.connect_to_local(skip_init_checks=True)
+    try:
+        if INDEX_MODE == "full" and CLASS_NAME in client.collections.list_all():
+            client.collections.delete(CLASS_NAME)
+            print(f"[OK] Dropped {CLASS_NAME} for full rebuild")
+        ensure_schema(client)
+
+        use_store = HAS_ARROW and os.path.exists(CHUNK_STORE_PATH)
+        if use_store:
+            n_rows, rows = count_rows(CHUNK_STORE_PATH), None
+        else:
+            rows = load_chunks(CHUNKS_PATH)
+            n_rows = len(rows)
+        if not n_rows:
+            print(f"[ERR] No rows in {CHUNK_STORE_PATH if use_store else CHUNKS_PATH}")
+            return
+        print(f"[OK] {n_rows} chunks in {CHUNK_STORE_PATH if use_store else CHUNKS_PATH}")
+
+        col = client.collections.get(CLASS_NAME)
+        pending = load_changeset(CHANGESET_PATH)
+        changeset = pending if INDEX_MODE == "changeset" else None
+        touched: Optional[Set[str]] = None
+        if changeset is not None:
+            # only the chunk_ids builds added/removed since the last index run can differ;
+            # skip the full-collection scan and diff that slice
+            touched = set(changeset["added"]) | set(changeset["removed"])
+            print(f"[OK] Changeset: {len(changeset['added'])} added / {len(changeset['removed'])} removed chunk_ids")
+        elif INDEX_MODE == "changeset":
+            print(f"[ERR] No changeset at {CHANGESET_PATH}; diffing the whole collection")
 
-            props = {
-                "chunk_id":   r.get("chunk_id"),
-                "text":       text,
-                "domain":     r.get("domain"),
-                "doc_type":   r.get("doc_type"),
-                "source_url": r.get("source_url"),
-                "file_path":  r.get("file_path"),
-                "section":    r.get("section"),
-                "title":      r.get("title"),
-                "sha256":     r.get("sha256"),
-                "raw_id":     r.get("raw_id"),
-                "page_no":    int(r.get("page_no") or 0),
-            }
-
-            vec = model.encode(
-                [text], batch_size=8, convert_to_numpy=True,
-                normalize_embeddings=True
-            )[0].tolist()
-
-            batch_objs.append({"properties": props, "vector": vec})
-
-            if len(batch_objs) >= BATCH_SIZE:
-                flush()
-            if i % 500 == 0:
-                print(f"  upserted {i}...")
-
-        flush()
-        print("[DONE] indexing complete")
+        # one target per domain tenant, or the whole collection
+        targets = [(t, col.with_tenant(t)) for t in TENANTS] if DOMAIN_TENANTS else [(None, col)]
+        t0 = time.perf_counter()
+        written = deleted = 0
+        failed: Set[str] = set()
+        reindexed: Set[str] = set()
+        cache = None
+        for domain, handle in targets:
+            existing, to_insert, stale, unchanged = plan_target(handle, rows, touched, domain)
+            print(f"[OK] {domain or CLASS_NAME}: {len(to_insert)} new/changed, {unchanged} unchanged, {len(stale)} stale")
+            if to_insert:
+                if cache is None:
+                    cache = EmbeddingCache(embedding_cache_key())
+                    print(f"[OK] Embedding cache: {len(cache)} vectors in {cache.dir}")
+                n, target_failed = index_rows(to_insert, make_encoder(cache), handle)
+                written += n
+                failed |= target_failed
+                # keep the old version of every chunk whose new version was not stored
+                stale = [u for u in stale if existing[u] not in target_failed]
+            # delete after inserting so changed chunks are never missing mid-run
+            deleted += delete_ids(handle, stale)
+            reindexed |= {p["chunk_id"] for p in to_insert} | {existing[u] for u in stale}
+        log_reindexed(reindexed, INDEX_MODE == "full")
+        elapsed = time.perf_counter() - t0
+        rate = written / elapsed if elapsed > 0 else 0.0
+        print(
+            f"[DONE] indexing complete: {written} chunks written, {deleted} deleted "
+            f"in {elapsed:.1f}s ({rate:.1f} chunks/sec)"
+        )
+        if failed:
+            print(f"[ERR] {len(failed)} chunk_ids failed to insert (old versions kept); rerun the indexer")
+        else:
+            # every mode leaves the collection in sync with the chunks, so the
+            # changes accumulated by builds since the last index run are applied
+            clear_changeset(CHANGESET_PATH, (pending or {}).get("built_at"))
     finally:
         client.close()
 
@@ -1,35 +1,72 @@
+import argparse
 from langgraph.graph import StateGraph, END
+from agents.state import AgentState
 from agents.orchestrator import orchestrator_agent
-from agents.intent_router import intent_router_agent
+from agents.semantic_cache import (
+    semantic_cache_agent, asemantic_cache_agent, semantic_cache_store_agent, route_after_cache
+)
+from agents.intent_router import intent_router_agent, short_circuit_agent, route_after_intent, load_centroids
 from agents.planner import planner_agent
-from agents.retrieval import hybrid_retrieval_agent
-from agents.synthesizer import synthesizer_agent
-from agents.validator import validator_agent
-from utils.weaviate_client import client
+from agents.retrieval import hybrid_retrieval_agent, ahybrid_retrieval_agent
+from agents.synthesizer import synthesizer_agent, asynthesizer_agent
+from agents.validator import validator_agent, route_after_validation
+from models.registry import preload
+from utils.weaviate_client import close_client
 
-def build_graph():
-    workflow = StateGraph(dict)
+def build_graph(async_mode: bool = False):
+    """
+    async_mode=True wires the async node variants (for graph.ainvoke): model
+    calls run on an executor and Weaviate goes through its async client.
+    The remaining nodes are cheap and shared by both modes.
+    Nodes return partial updates; AgentState merges them key by key.
+    """
+    workflow = StateGraph(AgentState)
 
     workflow.add_node("orchestrator", orchestrator_agent)
+    workflow.add_node("semantic_cache", asemantic_cache_agent if async_mode else semantic_cache_agent)
     workflow.add_node("router", intent_router_agent)
+    workflow.add_node("respond", short_circuit_agent)
     workflow.add_node("planner", planner_agent)
-    workflow.add_node("retrieval", hybrid_retrieval_agent)
-    workflow.add_node("synthesizer", synthesizer_agent)
+    workflow.add_node("retrieval", ahybrid_retrieval_agent if async_mode else hybrid_retrieval_agent)
+    workflow.add_node("synthesizer", asynthesizer_agent if async_mode else synthesizer_agent)
     workflow.add_node("validator", validator_agent)
+    workflow.add_node("cache_store", semantic_cache_store_agent)
 
     workflow.set_entry_point("orchestrator")
 
-    workflow.add_edge("orchestrator", "router")
-    workflow.add_edge("router", "planner")
+    workflow.add_edge("orchestrator", "semantic_cache")
+    workflow.add_conditional_edges("semantic_cache", route_after_cache, {"hit": END, "miss": "router"})
+    # chit-chat / unsupported: canned reply, no retrieval or generation
+    workflow.add_conditional_edges("router", route_after_intent, {"respond": "respond", "continue": "planner"})
+    workflow.add_edge("respond", END)
     workflow.add_edge("planner", "retrieval")
     workflow.add_edge("retrieval", "synthesizer")
     workflow.add_edge("synthesizer", "validator")
-    workflow.add_edge("validator", END)
+    # an ungrounded answer gets one regeneration on the same context
+    workflow.add_conditional_edges("validator", route_after_validation, {"retry": "synthesizer", "done": "cache_store"})
+    workflow.add_edge("cache_store", END)
 
     return workflow.compile()
 
 if __name__ == "__main__":
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--query", default="Compare treatment A with treatment B")
+    parser.add_argument("--preload", action="store_true",
+                        help="load + warm up all models before the first query (default: lazy)")
+    parser.add_argument("--stream", action="store_true", help="print the answer as it is generated")
+    args = parser.parse_args()
+
+    if args.preload:
+        preload()
+        load_centroids()
     graph = build_graph()
-    result = graph.invoke({"query": "Compare treatment A with treatment B"})
+    state = {"query": args.query}
+    if args.stream:
+        state["on_token"] = lambda piece: print(piece, end="", flush=True)
+    result = graph.invoke(state)
+    if args.stream:
+        print()
+    result.pop("on_token", None)
+    result.pop("query_vector", None)
     print(result)
-    client.close()  # cleanup
+    close_client()  # cleanup
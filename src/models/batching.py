@@ -0,0 +1,114 @@
+# src/models/batching.py
+# Dynamic micro-batching: concurrent callers submit single items, a worker
+# thread groups them (up to max_batch items or max_wait_ms) into one forward pass.
+
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, List, Sequence
+
+import yaml
+
+MODELS_CONFIG = os.getenv("MODELS_CONFIG", "configs/models.yaml")
+
+# name -> batcher, for metrics endpoints
+BATCHERS: Dict[str, "MicroBatcher"] = {}
+
+
+def load_batching_cfg(name: str, path: str = MODELS_CONFIG) -> Dict[str, Any]:
+    """
+    Per-model settings from the `batching:` section of configs/models.yaml.
+    """
+    if not os.path.exists(path):
+        return {}
+    with open(path, "r", encoding="utf-8") as f:
+        cfg = yaml.safe_load(f) or {}
+    return (cfg.get("batching") or {}).get(name) or {}
+
+
+class MicroBatcher:
+    """
+    `fn` takes a list of items and returns one result per item, in order.
+    submit() returns a Future; calling the batcher with a list blocks until
+    all of its items are done (they may be spread over several batches and
+    share batches with other callers).
+    """
+
+    def __init__(self, name: str, fn: Callable[[List[Any]], Sequence[Any]], max_batch: int = 32, max_wait_ms: float = 5.0):
+        self.name = name
+        self.fn = fn
+        self.max_batch = int(max_batch)
+        self.max_wait = float(max_wait_ms) / 1000.0
+        self._q: "queue.Queue" = queue.Queue()
+        self._stats = {"batches": 0, "items": 0, "max_queue_depth": 0, "busy_s": 0.0}
+        self._stats_lock = threading.Lock()
+        self._worker = threading.Thread(target=self._run, name=f"batcher-{name}", daemon=True)
+        self._worker.start()
+        BATCHERS[name] = self
+
+    @classmethod
+    def from_config(cls, name: str, fn: Callable[[List[Any]], Sequence[Any]], **defaults) -> "MicroBatcher":
+        return cls(name, fn, **{**defaults, **load_batching_cfg(name)})
+
+    # ---------- Submission ----------
+    def submit(self, item: Any) -> Future:
+        fut: Future = Future()
+        self._q.put((item, fut))
+        depth = self._q.qsize()
+        if depth > self._stats["max_queue_depth"]:
+            with self._stats_lock:
+                self._stats["max_queue_depth"] = max(self._stats["max_queue_depth"], depth)
+        return fut
+
+    def __call__(self, items: Sequence[Any]) -> List[Any]:
+        futures = [self.submit(it) for it in items]
+        return [f.result() for f in futures]
+
+    # ---------- Worker ----------
+    def _collect(self) -> List:
+        batch = [self._q.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._q.get(timeout=remaining) if remaining > 0 else self._q.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            items = [it for it, _ in batch]
+            t0 = time.perf_counter()
+            try:
+                results = list(self.fn(items))
+                if len(results) != len(items):
+                    raise RuntimeError(f"{self.name}: got {len(results)} results for {len(items)} items")
+            except Exception as e:
+                for _, fut in batch:
+                    fut.set_exception(e)
+                continue
+            finally:
+                with self._stats_lock:
+                    self._stats["batches"] += 1
+                    self._stats["items"] += len(items)
+                    self._stats["busy_s"] += time.perf_counter() - t0
+            for (_, fut), res in zip(batch, results):
+                fut.set_result(res)
+
+    # ---------- Metrics ----------
+    def stats(self) -> Dict[str, Any]:
+        with self._stats_lock:
+            s = dict(self._stats)
+        s["queue_depth"] = self._q.qsize()
+        s["avg_batch"] = s["items"] / s["batches"] if s["batches"] else 0.0
+        s["max_batch"] = self.max_batch
+        s["max_wait_ms"] = self.max_wait * 1000.0
+        return s
+
+
+def batcher_stats() -> Dict[str, Dict[str, Any]]:
+    return {name: b.stats() for name, b in BATCHERS.items()}
@@ -0,0 +1,132 @@
+# src/models/bench_backends.py
+# Compare torch vs ONNX Runtime (int8) backends for the embedder and reranker:
+# parity against torch, queries/sec and peak RSS. Each backend is measured in a
+# fresh subprocess so RSS numbers don't include the other backend's weights.
+#
+#   python -m src.models.bench_backends --n 256 --batch 16
+
+import argparse
+import json
+import multiprocessing as mp
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+from .onnx_backend import parity_check
+from .registry import build_model
+
+SAMPLE_TEXTS = [
+    "How do I reset my online banking password?",
+    "What is the routing number for my checking account?",
+    "How do I pair my phone with the Lucid Air over Bluetooth?",
+    "What does the tire pressure warning light mean?",
+    "How can I dispute a debit card transaction?",
+    "Where can I find the owner's manual for my vehicle?",
+    "How do I set up Zelle for sending money?",
+    "How long does a mobile deposit hold last?",
+]
+SAMPLE_PASSAGE = (
+    "To reset your password, select Forgot Password on the sign-on page and follow "
+    "the prompts. You will need your username and a verification code sent to your phone."
+)
+
+
+def _peak_rss_mb() -> Optional[float]:
+    """
+    Peak resident set of this process: ru_maxrss on POSIX (KiB on Linux,
+    bytes on macOS), psutil's peak working set on Windows (None without psutil).
+    """
+    if sys.platform == "win32":
+        try:
+            import psutil
+        except ImportError:
+            return None
+        return psutil.Process().memory_info().peak_wset / 2**20
+    import resource
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return maxrss / 2**20 if sys.platform == "darwin" else maxrss / 1024
+
+
+def _texts(n: int) -> List[str]:
+    return [f"{SAMPLE_TEXTS[i % len(SAMPLE_TEXTS)]} ({i})" for i in range(n)]
+
+
+def _bench_backend(backend: str, n: int, batch: int) -> Dict:
+    texts = _texts(n)
+    pairs: List[Tuple[str, str]] = [(t, SAMPLE_PASSAGE) for t in texts]
+    out: Dict = {"backend": backend}
+
+    t0 = time.perf_counter()
+    embedder = build_model("embedding", backend=backend)
+    reranker = build_model("reranker", backend=backend)
+    out["load_s"] = time.perf_counter() - t0
+
+    embedder.encode(texts[:batch], batch_size=batch, normalize_embeddings=True, convert_to_numpy=True)  # warmup
+    t0 = time.perf_counter()
+    for start in range(0, n, batch):
+        embedder.encode(texts[start:start + batch], batch_size=batch, normalize_embeddings=True, convert_to_numpy=True)
+    out["embed_qps"] = n / (time.perf_counter() - t0)
+
+    reranker.predict(pairs[:batch], batch_size=batch)  # warmup
+    t0 = time.perf_counter()
+    for start in range(0, n, batch):
+        reranker.predict(pairs[start:start + batch], batch_size=batch)
+    out["rerank_qps"] = n / (time.perf_counter() - t0)
+
+    out["peak_rss_mb"] = _peak_rss_mb()
+    return out
+
+
+def _child(backend: str, n: int, batch: int, conn):
+    try:
+        conn.send(_bench_backend(backend, n, batch))
+    except Exception as e:
+        conn.send({"backend": backend, "error": repr(e)})
+    finally:
+        conn.close()
+
+
+def _run_isolated(backend: str, n: int, batch: int) -> Dict:
+    ctx = mp.get_context("spawn")
+    parent, child = ctx.Pipe(duplex=False)
+    proc = ctx.Process(target=_child, args=(backend, n, batch, child))
+    proc.start()
+    result = parent.recv()
+    proc.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--n", type=int, default=256, help="texts / pairs per backend")
+    parser.add_argument("--batch", type=int, default=16)
+    parser.add_argument("--min-cosine", type=float, default=0.99)
+    parser.add_argument("--max-score-diff", type=float, default=0.05)
+    args = parser.parse_args()
+
+    # parity first: it also exports + caches the ONNX models for the timed runs
+    texts = _texts(32)
+    parity = parity_check(
+        build_model("embedding", backend="torch"), build_model("embedding", backend="onnx"),
+        build_model("reranker", backend="torch"), build_model("reranker", backend="onnx"),
+        texts, [(t, SAMPLE_PASSAGE) for t in texts],
+        min_cosine=args.min_cosine, max_score_diff=args.max_score_diff,
+    )
+    print(f"[{'OK' if parity['ok'] else 'ERR'}] parity: {json.dumps(parity)}")
+
+    for backend in ("torch", "onnx"):
+        r = _run_isolated(backend, args.n, args.batch)
+        if "error" in r:
+            print(f"[ERR] {backend}: {r['error']}")
+            continue
+        rss = "n/a (pip install psutil)" if r["peak_rss_mb"] is None else f"{r['peak_rss_mb']:.0f} MB"
+        print(
+            f"[OK] {backend:5s} load {r['load_s']:.1f}s | embed {r['embed_qps']:.1f} q/s | "
+            f"rerank {r['rerank_qps']:.1f} pairs/s | peak RSS {rss}"
+        )
+    if not parity["ok"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
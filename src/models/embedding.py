@@ -1,3 +1,14 @@
-from sentence_transformers import SentenceTransformer
+from .batching import MicroBatcher
+from .registry import get_model
 
-embedding_model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+
+def get_embedding_model():
+    return get_model("embedding")
+
+
+def encode(texts):
+    return get_embedding_model().encode(texts, normalize_embeddings=True, convert_to_numpy=True)
+
+
+# one normalized vector per text
+embedding_batcher = MicroBatcher.from_config("embedding", encode)
@@ -0,0 +1,177 @@
+# src/models/onnx_backend.py
+# ONNX Runtime CPU backend for the embedder and the cross-encoder.
+# On first use the HF model is exported to ONNX, dynamically quantized to int8
+# and cached under data/index/onnx/<model>/; later loads just open the session.
+# The wrappers mirror the SentenceTransformer.encode / CrossEncoder.predict
+# calls used in this repo, so the registry can swap them in transparently.
+
+import os
+import re
+from typing import Dict, List, Sequence, Tuple
+
+import numpy as np
+
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", "data/index/onnx")
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))  # 0 = let ORT decide
+
+# positional order of the HF encoder forward() arguments
+FORWARD_INPUTS = ("input_ids", "attention_mask", "token_type_ids")
+
+
+def _slug(model_id: str) -> str:
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", model_id)
+
+
+def export_quantized(model_id: str, kind: str, max_length: int = 256) -> str:
+    """
+    Export `model_id` to <cache>/<slug>/model.int8.onnx (+ tokenizer files)
+    unless it is already there. kind: "embedding" | "reranker".
+    Returns the cache directory.
+    """
+    out_dir = os.path.join(ONNX_CACHE_DIR, _slug(model_id))
+    int8_path = os.path.join(out_dir, "model.int8.onnx")
+    if os.path.exists(int8_path):
+        return out_dir
+
+    import torch
+    from transformers import AutoModel, AutoModelForSequenceClassification, AutoTokenizer
+    from onnxruntime.quantization import QuantType, quantize_dynamic
+
+    os.makedirs(out_dir, exist_ok=True)
+    tokenizer = AutoTokenizer.from_pretrained(model_id)
+    if kind == "embedding":
+        model = AutoModel.from_pretrained(model_id)
+        sample = tokenizer(["export sample"], return_tensors="pt")
+        output_names = ["last_hidden_state"]
+    else:
+        model = AutoModelForSequenceClassification.from_pretrained(model_id)
+        sample = tokenizer("export", "sample", return_tensors="pt")
+        output_names = ["logits"]
+    model.eval()
+
+    # torch.onnx.export binds the sample positionally, so follow the forward()
+    # signature (BERT: input_ids, attention_mask, token_type_ids), not the
+    # tokenizer's key order, or the graph inputs get each other's tensors
+    input_names = [n for n in FORWARD_INPUTS if n in sample]
+    dynamic_axes = {n: {0: "batch", 1: "seq"} for n in input_names}
+    dynamic_axes[output_names[0]] = {0: "batch"} if kind == "reranker" else {0: "batch", 1: "seq"}
+
+    fp32_path = os.path.join(out_dir, "model.onnx")
+    with torch.no_grad():
+        torch.onnx.export(
+            model,
+            tuple(sample[n] for n in input_names),
+            fp32_path,
+            input_names=input_names,
+            output_names=output_names,
+            dynamic_axes=dynamic_axes,
+            opset_version=14,
+        )
+    quantize_dynamic(fp32_path, int8_path, weight_type=QuantType.QInt8)
+    os.remove(fp32_path)
+    tokenizer.save_pretrained(out_dir)
+    print(f"[OK] Exported {model_id} -> {int8_path}")
+    return out_dir
+
+
+def _session(model_dir: str):
+    import onnxruntime as ort
+
+    opts = ort.SessionOptions()
+    if ONNX_THREADS:
+        opts.intra_op_num_threads = ONNX_THREADS
+    opts.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+    return ort.InferenceSession(
+        os.path.join(model_dir, "model.int8.onnx"), opts, providers=["CPUExecutionProvider"]
+    )
+
+
+class _OnnxBase:
+    def __init__(self, model_id: str, kind: str, max_length: int):
+        from transformers import AutoTokenizer
+
+        self.model_id = model_id
+        self.max_length = max_length
+        model_dir = export_quantized(model_id, kind, max_length)
+        self.session = _session(model_dir)
+        names = [i.name for i in self.session.get_inputs()]
+        if names != [n for n in FORWARD_INPUTS if n in names]:
+            # cached by an export that bound the inputs in tokenizer order
+            print(f"[ERR] {model_dir}: ONNX inputs {names} out of forward() order, re-exporting")
+            os.remove(os.path.join(model_dir, "model.int8.onnx"))
+            model_dir = export_quantized(model_id, kind, max_length)
+            self.session = _session(model_dir)
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+        self._inputs = {i.name for i in self.session.get_inputs()}
+
+    def _feed(self, enc) -> Dict[str, np.ndarray]:
+        return {k: v.astype(np.int64) for k, v in enc.items() if k in self._inputs}
+
+
+class OnnxEmbedder(_OnnxBase):
+    """
+    Mean-pooled sentence embeddings (the pooling all-MiniLM-L6-v2 uses).
+    """
+
+    def __init__(self, model_id: str, max_length: int = 256):
+        super().__init__(model_id, "embedding", max_length)
+
+    def encode(self, texts: Sequence[str], batch_size: int = 32, normalize_embeddings: bool = False,
+               convert_to_numpy: bool = True, **_) -> np.ndarray:
+        out: List[np.ndarray] = []
+        for start in range(0, len(texts), batch_size):
+            enc = self.tokenizer(
+                list(texts[start:start + batch_size]), padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="np",
+            )
+            hidden = self.session.run(None, self._feed(enc))[0]
+            mask = enc["attention_mask"][..., None].astype(np.float32)
+            vecs = (hidden * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+            if normalize_embeddings:
+                vecs = vecs / np.clip(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12, None)
+            out.append(vecs.astype(np.float32))
+        return np.concatenate(out) if out else np.zeros((0, 0), np.float32)
+
+
+class OnnxCrossEncoder(_OnnxBase):
+    """
+    Single-logit cross-encoder; sigmoid applied like CrossEncoder.predict.
+    """
+
+    def __init__(self, model_id: str, max_length: int = 256):
+        super().__init__(model_id, "reranker", max_length)
+
+    def predict(self, pairs: Sequence[Tuple[str, str]], batch_size: int = 32, **_) -> np.ndarray:
+        out: List[np.ndarray] = []
+        for start in range(0, len(pairs), batch_size):
+            part = pairs[start:start + batch_size]
+            enc = self.tokenizer(
+                [q for q, _ in part], [p for _, p in part], padding=True, truncation=True,
+                max_length=self.max_length, return_tensors="np",
+            )
+            logits = self.session.run(None, self._feed(enc))[0][:, 0]
+            out.append(1.0 / (1.0 + np.exp(-logits)))
+        return np.concatenate(out) if out else np.zeros((0,), np.float32)
+
+
+def parity_check(torch_embedder, onnx_embedder, torch_reranker, onnx_reranker,
+                 texts: Sequence[str], pairs: Sequence[Tuple[str, str]],
+                 min_cosine: float = 0.99, max_score_diff: float = 0.05) -> Dict[str, float]:
+    """
+    Compare ONNX int8 outputs with the torch reference.
+    Embeddings: per-text cosine similarity >= min_cosine.
+    Reranker:   per-pair |score diff| <= max_score_diff (sigmoid scores).
+    """
+    ref = torch_embedder.encode(list(texts), normalize_embeddings=True, convert_to_numpy=True)
+    got = onnx_embedder.encode(list(texts), normalize_embeddings=True)
+    cosines = (ref * got).sum(axis=1)
+
+    ref_scores = np.asarray(torch_reranker.predict(list(pairs)), dtype=np.float32)
+    got_scores = np.asarray(onnx_reranker.predict(list(pairs)), dtype=np.float32)
+    diffs = np.abs(ref_scores - got_scores)
+
+    return {
+        "min_cosine": float(cosines.min()),
+        "max_score_diff": float(diffs.max()),
+        "ok": bool(cosines.min() >= min_cosine and diffs.max() <= max_score_diff),
+    }
@@ -0,0 +1,146 @@
+# src/models/registry.py
+# Central lazy model registry. Model IDs come from configs/models.yaml; each
+# model is loaded once, on first use, and shared by everything in the process
+# (agents, indexer, batchers). Heavy libraries are imported inside the loaders,
+# so importing this module (or the agents) costs nothing until a model is used.
+
+import os
+import time
+import threading
+from typing import Any, Callable, Dict, Iterable, Optional
+
+import yaml
+
+MODELS_CONFIG = os.getenv("MODELS_CONFIG", "configs/models.yaml")
+
+# backend: "torch" (fp32 PyTorch) or "onnx" (ONNX Runtime, dynamic int8; embedding/reranker only)
+DEFAULT_MODELS: Dict[str, Dict[str, Any]] = {
+    "embedding": {"id": "sentence-transformers/all-MiniLM-L6-v2", "device": "cpu", "backend": "torch", "max_length": 256},
+    "reranker":  {"id": "cross-encoder/ms-marco-MiniLM-L-6-v2", "device": "cpu", "backend": "torch", "max_length": 256},
+    "generator": {"id": "google/flan-t5-base", "device": "cpu", "backend": "torch", "max_length": 512},
+}
+
+# legacy env overrides, still honored
+_ENV_OVERRIDES = {"embedding": "EMB_MODEL_ID", "reranker": "RERANK_MODEL_ID", "generator": "GEN_MODEL_ID"}
+
+_models: Dict[str, Any] = {}
+_tokenizers: Dict[str, Any] = {}
+_tokenizer_lock = threading.Lock()
+_locks: Dict[str, threading.Lock] = {name: threading.Lock() for name in DEFAULT_MODELS}
+_cfg: Optional[Dict[str, Dict[str, Any]]] = None
+
+
+def model_cfg(name: str) -> Dict[str, Any]:
+    global _cfg
+    if _cfg is None:
+        loaded: Dict[str, Any] = {}
+        if os.path.exists(MODELS_CONFIG):
+            with open(MODELS_CONFIG, "r", encoding="utf-8") as f:
+                loaded = (yaml.safe_load(f) or {}).get("models") or {}
+        _cfg = {n: {**d, **(loaded.get(n) or {})} for n, d in DEFAULT_MODELS.items()}
+    cfg = dict(_cfg[name])
+    env = os.getenv(_ENV_OVERRIDES[name])
+    if env:
+        cfg["id"] = env
+    return cfg
+
+
+def model_id(name: str) -> str:
+    return model_cfg(name)["id"]
+
+
+def embedding_cache_key() -> str:
+    """
+    Key for the on-disk embedding cache: int8 ONNX vectors are close to, but
+    not bit-identical with, the torch ones, so each backend gets its own cache.
+    """
+    cfg = model_cfg("embedding")
+    return cfg["id"] if cfg["backend"] == "torch" else f"{cfg['id']}@{cfg['backend']}-int8"
+
+
+# ---------- Loaders ----------
+def _load_embedding(cfg: Dict[str, Any]):
+    if cfg["backend"] == "onnx":
+        from .onnx_backend import OnnxEmbedder
+        return OnnxEmbedder(cfg["id"], max_length=int(cfg["max_length"]))
+    from sentence_transformers import SentenceTransformer
+    return SentenceTransformer(cfg["id"], device=cfg["device"])
+
+
+def _load_reranker(cfg: Dict[str, Any]):
+    if cfg["backend"] == "onnx":
+        from .onnx_backend import OnnxCrossEncoder
+        return OnnxCrossEncoder(cfg["id"], max_length=int(cfg["max_length"]))
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(cfg["id"], device=cfg["device"], max_length=int(cfg["max_length"]))
+
+
+def _load_generator(cfg: Dict[str, Any]):
+    from transformers import pipeline
+    return pipeline("text2text-generation", model=cfg["id"], device=cfg["device"])
+
+
+_LOADERS: Dict[str, Callable[[Dict[str, Any]], Any]] = {
+    "embedding": _load_embedding,
+    "reranker": _load_reranker,
+    "generator": _load_generator,
+}
+
+_WARMUPS: Dict[str, Callable[[Any], Any]] = {
+    "embedding": lambda m: m.encode(["warmup"], convert_to_numpy=True),
+    "reranker": lambda m: m.predict([("warmup", "warmup")]),
+    "generator": lambda m: m("warmup", max_new_tokens=1),
+}
+
+
+# ---------- Public API ----------
+def get_model(name: str):
+    model = _models.get(name)
+    if model is not None:
+        return model
+    with _locks[name]:
+        if name not in _models:
+            cfg = model_cfg(name)
+            t0 = time.perf_counter()
+            _models[name] = _LOADERS[name](cfg)
+            print(f"[OK] Loaded {name} model {cfg['id']} in {time.perf_counter() - t0:.1f}s")
+        return _models[name]
+
+
+def get_tokenizer(name: str):
+    """
+    Fast (Rust) HF tokenizer of a registered model; loads without the weights,
+    so CPU-only tools (chunker, context packer) can count tokens cheaply.
+    """
+    tok = _tokenizers.get(name)
+    if tok is not None:
+        return tok
+    with _tokenizer_lock:
+        if name not in _tokenizers:
+            from transformers import AutoTokenizer
+            _tokenizers[name] = AutoTokenizer.from_pretrained(model_id(name), use_fast=True)
+        return _tokenizers[name]
+
+
+def build_model(name: str, **overrides):
+    """
+    Load a fresh, unshared instance with config overrides (e.g. backend="onnx").
+    Used by parity checks and benchmarks; the app should use get_model().
+    """
+    return _LOADERS[name]({**model_cfg(name), **overrides})
+
+
+def is_loaded(name: str) -> bool:
+    return name in _models
+
+
+def preload(names: Optional[Iterable[str]] = None, warmup: bool = True):
+    """
+    Load (and optionally run one tiny forward pass through) the given models,
+    all of them by default. Use at service startup; CLI tools and tests that
+    never touch a model should simply not call this.
+    """
+    for name in names or DEFAULT_MODELS:
+        model = get_model(name)
+        if warmup:
+            _WARMUPS[name](model)
@@ -1,3 +1,14 @@
-from sentence_transformers import CrossEncoder
+from .batching import MicroBatcher
+from .registry import get_model
 
-cross_encoder = CrossEncoder("cross-encoder/ms-marco-MiniLM-L-6-v2")
+
+def get_cross_encoder():
+    return get_model("reranker")
+
+
+def predict(pairs):
+    return [float(s) for s in get_cross_encoder().predict(pairs)]
+
+
+# one float score per (query, passage) pair
+reranker_batcher = MicroBatcher.from_config("reranker", predict)
@@ -0,0 +1,88 @@
+# src/parsing/bench_chunking.py
+# Compare chunking modes on the real corpus: chunks per document, chunk length
+# in embedding tokens (and how many would be truncated by the embedder), and
+# chunking throughput. Text extraction happens once up front and is not timed.
+#
+#   python -m src.parsing.bench_chunking --limit 200 --modes tokens chars
+
+import argparse
+import statistics
+import time
+from typing import Dict, List
+
+from src.parsing.build_processed_chunks import build_jobs
+from src.parsing.pdf_to_chunks import _pymupdf_extract
+from src.utils.chunking import WORDS_PER_TOKEN, _HAS_TRANSFORMERS, active_mode, chunk_sections, default_max_tokens
+from src.utils.helpers import RAW_META_DIR
+from src.utils.html_parse import parse_file_cached
+from src.models.registry import get_tokenizer, model_cfg
+
+
+def _load_sections(job: Dict) -> List[Dict]:
+    if job["kind"] == "pdf":
+        return [{"paragraphs": [p["text"]], "section": p["section"], "page_no": p["page_no"]}
+                for p in _pymupdf_extract(job["path"])]
+    page = parse_file_cached(job["path"], job["sha256"])
+    if page is None:
+        return []
+    return [{"paragraphs": page.main_text.split("\n"), "section": page.section_path, "page_no": None}]
+
+
+def _token_lengths(texts: List[str]) -> List[int]:
+    if _HAS_TRANSFORMERS:
+        enc = get_tokenizer("embedding")(texts, add_special_tokens=False, verbose=False)
+        return [len(ids) for ids in enc["input_ids"]]
+    return [int(len(t.split()) / WORDS_PER_TOKEN) for t in texts]  # estimate
+
+
+def bench_mode(docs: List[List[Dict]], mode: str, max_tokens: int) -> Dict:
+    n_chars = sum(len(p) for secs in docs for s in secs for p in s["paragraphs"])
+    chunk_sections(docs[0], max_tokens=max_tokens, mode=mode)  # warmup (loads tokenizer)
+    t0 = time.perf_counter()
+    chunks = [chunk_sections(secs, max_tokens=max_tokens, mode=mode) for secs in docs]
+    secs = time.perf_counter() - t0
+
+    lengths = sorted(_token_lengths([c["text"] for doc in chunks for c in doc]) or [0])
+    window = int(model_cfg("embedding").get("max_length", 256)) - 2
+    return {
+        "mode": active_mode(mode),
+        "max_tokens": max_tokens,
+        "chunks": len(lengths),
+        "chunks_per_doc": len(lengths) / len(docs),
+        "mean_tokens": statistics.mean(lengths),
+        "p95_tokens": lengths[int(0.95 * (len(lengths) - 1))],
+        "over_window": sum(1 for n in lengths if n > window),
+        "docs_per_s": len(docs) / secs,
+        "mb_per_s": n_chars / secs / 2**20,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--manifest", default=f"{RAW_META_DIR}/manifest.jsonl")
+    parser.add_argument("--limit", type=int, default=0, help="documents to use (0 = all)")
+    parser.add_argument("--modes", nargs="+", default=["tokens", "chars"])
+    parser.add_argument("--max-tokens", type=int, default=0, help="0 = mode default (embedding window for tokens)")
+    args = parser.parse_args()
+
+    jobs = build_jobs(args.manifest)
+    if args.limit:
+        jobs = jobs[:args.limit]
+    t0 = time.perf_counter()
+    docs = [secs for secs in (_load_sections(j) for j in jobs) if secs]
+    if not docs:
+        print(f"[ERR] No documents in {args.manifest}")
+        return
+    print(f"[OK] Extracted {len(docs)} documents in {time.perf_counter() - t0:.1f}s (not timed below)")
+
+    for mode in args.modes:
+        r = bench_mode(docs, mode, args.max_tokens or default_max_tokens(mode))
+        print(
+            f"[OK] {mode:6s} -> {r['mode']:6s} max {r['max_tokens']:4d} | {r['chunks']} chunks "
+            f"({r['chunks_per_doc']:.1f}/doc) | tokens mean {r['mean_tokens']:.0f} p95 {r['p95_tokens']} "
+            f"| {r['over_window']} over window | {r['docs_per_s']:.1f} docs/s, {r['mb_per_s']:.2f} MB/s"
+        )
+
+
+if __name__ == "__main__":
+    main()
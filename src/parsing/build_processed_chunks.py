@@ -1,15 +1,37 @@
-import os, json
-from typing import Dict, List, Optional
+import os, json, time, hashlib
+from collections import deque
+from contextlib import ExitStack, contextmanager
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
 from urllib.parse import urlparse
 
 from src.scraping.raw_cataloger import build_log_meta_map
 from src.utils.helpers import RAW_META_DIR
 from src.parsing.pdf_to_chunks import pdf_to_chunks
 from src.parsing.html_to_chunks import html_to_chunks
+from src.utils.chunking import chunker_signature, default_max_tokens
+from src.utils.html_parse import PARSER_VERSION
+from src.utils.chunk_store import CHUNK_STORE_PATH, HAS_ARROW, ChunkStoreWriter
 
 OUT_DIR = "data/processed/chunks"
 os.makedirs(OUT_DIR, exist_ok=True)
 
+CHUNK_WORKERS = int(os.getenv("CHUNK_WORKERS", str(os.cpu_count() or 1)))
+SLOW_DOC_SECONDS = float(os.getenv("SLOW_DOC_SECONDS", "5"))
+REPORT_SLOWEST = 10
+
+CHUNK_CACHE_DIR = os.getenv("CHUNK_CACHE_DIR", "data/processed/chunk_cache")
+CHUNK_INDEX_PATH = os.path.join(CHUNK_CACHE_DIR, "index.json")
+CHANGESET_PATH = os.path.join(OUT_DIR, "changeset.json")
+# defaults to the embedding window in tokens (configs/models.yaml max_length - 2)
+CHUNK_PARAMS = {
+    "max_tokens": int(os.getenv("CHUNK_MAX_TOKENS", "0")) or default_max_tokens(),
+    "overlap_ratio": 0.15,
+}
+PDF_EXTRACTOR_VERSION = 1  # bump when pdf_to_chunks' page extraction changes
+# JSONL copies are for debugging; always written when pyarrow is missing
+EXPORT_JSONL = os.getenv("EXPORT_JSONL", "1") == "1" or not HAS_ARROW
+
 
 def _detect_domain(source_url: Optional[str], file_path: str) -> str:
     if source_url:
@@ -30,17 +52,176 @@ def _chunk_id(prefix: str, idx: int, page_no: Optional[int]) -> str:
     return f"{prefix}_p{page_no or 0}_c{idx}"
 
 
+@contextmanager
+def _atomic_open(path: str):
+    """
+    Text file written as <path>.tmp and swapped in only if the block succeeds,
+    so a failed build leaves the previous output in place (like ChunkStoreWriter).
+    """
+    tmp = path + ".tmp"
+    f = open(tmp, "w", encoding="utf-8")
+    try:
+        yield f
+    except BaseException:
+        f.close()
+        os.remove(tmp)
+        raise
+    f.close()
+    os.replace(tmp, path)
+
+
 def _write_jsonl(path: str, rows: List[Dict]):
     with open(path, "w", encoding="utf-8") as f:
         for r in rows:
             f.write(json.dumps(r, ensure_ascii=False) + "\n")
 
 
-def main():
-    manifest_path = os.path.join(RAW_META_DIR, "manifest.jsonl")
-    if not os.path.exists(manifest_path):
-        raise FileNotFoundError(f"Missing manifest at {manifest_path}. Run raw_cataloger first.")
+# ---------- Chunk cache ----------
+def cache_key(job: Dict) -> str:
+    """
+    Chunks depend only on the document bytes, the chunker params and the
+    parser/chunker versions; per-source metadata is re-stamped on reuse.
+    """
+    parser_version = PARSER_VERSION if job["kind"] == "html" else PDF_EXTRACTOR_VERSION
+    raw = json.dumps(
+        [job["kind"], job["sha256"], CHUNK_PARAMS, parser_version, chunker_signature()], sort_keys=True
+    )
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+def _cache_path(key: str) -> str:
+    return os.path.join(CHUNK_CACHE_DIR, key[:2], f"{key}.jsonl")
+
+
+def _load_cached(key: str) -> Optional[List[Dict]]:
+    path = _cache_path(key)
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        return [json.loads(line) for line in f]
+
+
+def _store_cached(key: str, rows: List[Dict]):
+    path = _cache_path(key)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    _write_jsonl(path + ".tmp", rows)
+    os.replace(path + ".tmp", path)
+
+
+def _stamp(rows: List[Dict], job: Dict) -> List[Dict]:
+    """
+    Apply the per-source fields (ids, provenance) to freshly parsed or cached rows.
+    """
+    prefix = os.path.splitext(os.path.basename(job["path"]))[0]
+    for i, ch in enumerate(rows, start=1):
+        ch["chunk_id"] = _chunk_id(prefix, i, ch.get("page_no") if job["kind"] == "pdf" else None)
+        ch["domain"] = job["domain"]
+        ch["file_path"] = job["path"]
+        ch["source_url"] = job["source_url"] if job["kind"] == "pdf" else (job["source_url"] or "")
+        ch["sha256"] = job["sha256"]
+        ch["raw_id"] = job["raw_id"]
+    return rows
+
+
+def process_doc(job: Dict) -> Tuple[List[Dict], float]:
+    """
+    Parse + chunk one raw document (runs in a worker process) and store the
+    result in the chunk cache. Returns (chunk rows, parse seconds).
+    """
+    t0 = time.perf_counter()
+    norm_path, kind = job["path"], job["kind"]
+
+    if kind == "pdf":
+        chunks = pdf_to_chunks(norm_path, domain=job["domain"], source_url=job["source_url"], **CHUNK_PARAMS)
+    else:
+        chunks = html_to_chunks(norm_path, source_url=job["source_url"] or "", domain=job["domain"],
+                                sha256=job["sha256"], **CHUNK_PARAMS)
+
+    _store_cached(job["key"], chunks)
+    return _stamp(chunks, job), time.perf_counter() - t0
+
+
+def _load_index() -> Dict[str, Dict]:
+    if not os.path.exists(CHUNK_INDEX_PATH):
+        return {}
+    with open(CHUNK_INDEX_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _save_index(index: Dict[str, Dict]):
+    os.makedirs(CHUNK_CACHE_DIR, exist_ok=True)
+    with open(CHUNK_INDEX_PATH + ".tmp", "w", encoding="utf-8") as f:
+        json.dump(index, f)
+    os.replace(CHUNK_INDEX_PATH + ".tmp", CHUNK_INDEX_PATH)
+
+
+def build_changeset(old_index: Dict[str, Dict], new_index: Dict[str, Dict]) -> Dict:
+    """
+    Chunk-level diff between two builds. A re-chunked document lists all its
+    old chunk_ids as removed and all its new ones as added (ids can repeat
+    across both lists when text changed under the same id).
+    """
+    added, removed = set(), set()
+    changed_docs, new_docs, removed_docs = [], [], []
+    for path, new in new_index.items():
+        old = old_index.get(path)
+        if old is None:
+            new_docs.append(path)
+            added.update(new["chunk_ids"])
+        elif old["key"] != new["key"] or old["chunk_ids"] != new["chunk_ids"]:
+            changed_docs.append(path)
+            removed.update(old["chunk_ids"])
+            added.update(new["chunk_ids"])
+    for path, old in old_index.items():
+        if path not in new_index:
+            removed_docs.append(path)
+            removed.update(old["chunk_ids"])
+    return {
+        "built_at": int(time.time()),
+        "added": sorted(added),
+        "removed": sorted(removed),
+        "new_docs": sorted(new_docs),
+        "changed_docs": sorted(changed_docs),
+        "removed_docs": sorted(removed_docs),
+    }
 
+
+def merge_changeset(pending: Optional[Dict], new: Dict) -> Dict:
+    """
+    Fold a build's changeset into the one still waiting for the indexer, so
+    consecutive builds without an index run in between lose nothing. The
+    indexer only needs the union of touched chunk_ids: it re-diffs them
+    against the current chunks. It empties the file after a successful run.
+    """
+    if not pending:
+        return new
+    merged = {k: sorted(set(pending.get(k, [])) | set(new[k]))
+              for k in ("added", "removed", "new_docs", "changed_docs", "removed_docs")}
+    return {"built_at": new["built_at"], **merged}
+
+
+def _load_changeset() -> Optional[Dict]:
+    if not os.path.exists(CHANGESET_PATH):
+        return None
+    with open(CHANGESET_PATH, "r", encoding="utf-8") as f:
+        return json.load(f)
+
+
+def _prune_cache(live_keys: set):
+    """
+    Drop cached chunk files for documents that left the manifest or changed.
+    """
+    for root, _, files in os.walk(CHUNK_CACHE_DIR):
+        for name in files:
+            if name.endswith(".jsonl") and name[:-len(".jsonl")] not in live_keys:
+                os.remove(os.path.join(root, name))
+
+
+def build_jobs(manifest_path: str) -> List[Dict]:
+    """
+    One job per existing raw file in the manifest: PDFs first, then HTML,
+    each in manifest order (this is the row order of all_chunks.jsonl).
+    """
     # manifest path -> record
     path2manifest: Dict[str, Dict] = {}
     with open(manifest_path, "r", encoding="utf-8") as f:
@@ -55,48 +236,125 @@ def main():
     # per-host log metadata (adds source_url, raw_id)
     log_meta = build_log_meta_map()
 
-    pdf_rows: List[Dict] = []
-    html_rows: List[Dict] = []
-
+    jobs: Dict[str, List[Dict]] = {"pdf": [], "html": []}
     for norm_path, mrec in path2manifest.items():
-        if not os.path.exists(norm_path):
-            continue
-
         kind = mrec.get("kind")
-        sha256 = mrec.get("sha256")
+        if kind not in jobs or not os.path.exists(norm_path):
+            continue
         source_url = mrec.get("source_url") or (log_meta.get(norm_path) or {}).get("source_url")
-        raw_id = (log_meta.get(norm_path) or {}).get("raw_id") or f"manual:{os.path.basename(norm_path)}"
-        domain = _detect_domain(source_url, norm_path)
-
-        if kind == "pdf":
-            chunks = pdf_to_chunks(norm_path, domain=domain, source_url=source_url)
-            for i, ch in enumerate(chunks, start=1):
-                prefix = os.path.splitext(os.path.basename(norm_path))[0]
-                ch["chunk_id"] = _chunk_id(prefix, i, ch.get("page_no"))
-                ch["sha256"] = sha256
-                ch["raw_id"] = raw_id
-            pdf_rows.extend(chunks)
-
-        elif kind == "html":
-            chunks = html_to_chunks(norm_path, source_url=source_url or "", domain=domain)
-            for i, ch in enumerate(chunks, start=1):
-                prefix = os.path.splitext(os.path.basename(norm_path))[0]
-                ch["chunk_id"] = _chunk_id(prefix, i, None)
-                ch["sha256"] = sha256
-                ch["raw_id"] = raw_id
-            html_rows.extend(chunks)
+        jobs[kind].append({
+            "kind": kind,
+            "path": norm_path,
+            "sha256": mrec.get("sha256"),
+            "source_url": source_url,
+            "raw_id": (log_meta.get(norm_path) or {}).get("raw_id") or f"manual:{os.path.basename(norm_path)}",
+            "domain": _detect_domain(source_url, norm_path),
+        })
+    ordered = jobs["pdf"] + jobs["html"]
+    for job in ordered:
+        job["key"] = cache_key(job)
+    return ordered
+
+
+def iter_processed(jobs: Iterable[Dict], workers: int) -> Iterator[Tuple[Dict, List[Dict], Optional[float]]]:
+    """
+    Yield (job, rows, seconds) in job order while up to `workers * 2` documents
+    are parsed ahead in worker processes; results never pile up beyond that window.
+    Documents with a cached parse are served from the chunk cache (seconds=None).
+    """
+    def cached(job):
+        rows = _load_cached(job["key"])
+        return None if rows is None else _stamp(rows, job)
+
+    if workers <= 1:
+        for job in jobs:
+            rows = cached(job)
+            if rows is not None:
+                yield job, rows, None
+            else:
+                yield (job, *process_doc(job))
+        return
+
+    window = workers * 2
+    with ProcessPoolExecutor(max_workers=workers) as pool:
+        pending: deque = deque()
+        for job in jobs:
+            rows = cached(job)
+            pending.append((job, rows if rows is not None else pool.submit(process_doc, job)))
+            if len(pending) >= window:
+                yield _resolve(*pending.popleft())
+        while pending:
+            yield _resolve(*pending.popleft())
+
+
+def _resolve(job: Dict, rows_or_future) -> Tuple[Dict, List[Dict], Optional[float]]:
+    if isinstance(rows_or_future, list):
+        return job, rows_or_future, None
+    return (job, *rows_or_future.result())
+
+
+def main():
+    manifest_path = os.path.join(RAW_META_DIR, "manifest.jsonl")
+    if not os.path.exists(manifest_path):
+        raise FileNotFoundError(f"Missing manifest at {manifest_path}. Run raw_cataloger first.")
+
+    jobs = build_jobs(manifest_path)
 
     out_pdf = os.path.join(OUT_DIR, "pdf_chunks.jsonl")
     out_html = os.path.join(OUT_DIR, "html_chunks.jsonl")
     out_all = os.path.join(OUT_DIR, "all_chunks.jsonl")
 
-    _write_jsonl(out_pdf, pdf_rows)
-    _write_jsonl(out_html, html_rows)
-    _write_jsonl(out_all, pdf_rows + html_rows)
+    counts = {"pdf": 0, "html": 0}
+    timings: List[Tuple[float, str]] = []
+    old_index = _load_index()
+    new_index: Dict[str, Dict] = {}
+    t0 = time.perf_counter()
+    with ExitStack() as stack:
+        store = stack.enter_context(ChunkStoreWriter(CHUNK_STORE_PATH)) if HAS_ARROW else None
+        if EXPORT_JSONL:
+            f_all = stack.enter_context(_atomic_open(out_all))
+            by_kind = {
+                "pdf": stack.enter_context(_atomic_open(out_pdf)),
+                "html": stack.enter_context(_atomic_open(out_html)),
+            }
+        for job, rows, secs in iter_processed(jobs, CHUNK_WORKERS):
+            new_index[job["path"]] = {"key": job["key"], "chunk_ids": [r["chunk_id"] for r in rows]}
+            if secs is not None:
+                timings.append((secs, job["path"]))
+                if secs >= SLOW_DOC_SECONDS:
+                    print(f"[SLOW] {job['path']}: {secs:.1f}s ({len(rows)} chunks)")
+            if store is not None:
+                store.write(rows)
+            if EXPORT_JSONL:
+                for r in rows:
+                    line = json.dumps(r, ensure_ascii=False) + "\n"
+                    by_kind[job["kind"]].write(line)
+                    f_all.write(line)
+            counts[job["kind"]] += len(rows)
+    elapsed = time.perf_counter() - t0
+
+    changeset = build_changeset(old_index, new_index)
+    pending = merge_changeset(_load_changeset(), changeset)
+    with _atomic_open(CHANGESET_PATH) as f:
+        json.dump(pending, f, ensure_ascii=False, indent=1)
+    _save_index(new_index)
+    _prune_cache({job["key"] for job in jobs})
 
-    print(f"[OK] PDF chunks:  {out_pdf} ({len(pdf_rows)} rows)")
-    print(f"[OK] HTML chunks: {out_html} ({len(html_rows)} rows)")
-    print(f"[OK] All chunks:  {out_all} ({len(pdf_rows) + len(html_rows)} rows)")
+    total = counts["pdf"] + counts["html"]
+    if HAS_ARROW:
+        print(f"[OK] Chunk store: {CHUNK_STORE_PATH} ({total} rows)")
+    else:
+        print("[ERR] pyarrow not installed; chunk store skipped (JSONL only)")
+    if EXPORT_JSONL:
+        print(f"[OK] PDF chunks:  {out_pdf} ({counts['pdf']} rows)")
+        print(f"[OK] HTML chunks: {out_html} ({counts['html']} rows)")
+        print(f"[OK] All chunks:  {out_all} ({total} rows)")
+    print(f"[OK] Changeset:   {CHANGESET_PATH} (+{len(changeset['added'])} / -{len(changeset['removed'])} chunk_ids; "
+          f"pending for the indexer: +{len(pending['added'])} / -{len(pending['removed'])})")
+    print(f"[OK] {len(jobs)} documents in {elapsed:.1f}s with {CHUNK_WORKERS} workers "
+          f"({len(timings)} parsed, {len(jobs) - len(timings)} from cache); slowest:")
+    for secs, path in sorted(timings, reverse=True)[:REPORT_SLOWEST]:
+        print(f"  {secs:7.2f}s  {path}")
 
 
 if __name__ == "__main__":
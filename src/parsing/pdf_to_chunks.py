@@ -8,7 +8,7 @@ PDF → chunks
 from typing import Dict, List, Optional
 import fitz  # PyMuPDF
 
-from src.utils.chunking import heading_aware_chunks
+from src.utils.chunking import chunk_sections
 
 
 # =========================
@@ -59,7 +59,7 @@ def pdf_to_chunks(
     pdf_path: str,
     domain: str,
     source_url: Optional[str] = None,
-    max_tokens: int = 300,
+    max_tokens: Optional[int] = None,
     overlap_ratio: float = 0.15,
 ) -> List[Dict]:
     """
@@ -74,23 +74,15 @@ def pdf_to_chunks(
     # --- FUTURE (rich) PATH: Docling ---
     # pages = _docling_extract(pdf_path) if _DOCLING_AVAILABLE else _pymupdf_extract(pdf_path)
 
-    all_chunks: List[Dict] = []
-    for rec in pages:
-        page_no, section, text = rec["page_no"], rec["section"], rec["text"]
-        chunks = heading_aware_chunks(
-            [text],
-            max_tokens=max_tokens,
-            overlap_ratio=overlap_ratio,
-            section_path=section,
-            page_no=page_no,
-        )
-        for ch in chunks:
-            ch.update({
-                "domain": domain,
-                "doc_type": "pdf",
-                "file_path": pdf_path,
-                "source_url": source_url,
-            })
-        all_chunks.extend(chunks)
+    # one section per page: chunks never span pages, all pages tokenized in one batch
+    sections = [{"paragraphs": [rec["text"]], "section": rec["section"], "page_no": rec["page_no"]} for rec in pages]
+    all_chunks = chunk_sections(sections, max_tokens=max_tokens, overlap_ratio=overlap_ratio)
+    for ch in all_chunks:
+        ch.update({
+            "domain": domain,
+            "doc_type": "pdf",
+            "file_path": pdf_path,
+            "source_url": source_url,
+        })
 
     return all_chunks
@@ -1,91 +1,267 @@
-import os, queue, time, urllib.parse as up
+import os, json, time, threading, urllib.parse as up
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
 from dataclasses import dataclass, field
-from typing import List, Set, Dict, Any
+from typing import Deque, List, Optional, Set, Dict, Any, Tuple
 
 from src.utils.config import load_config, get_crawler_cfg
 from src.utils.helpers import (
-    RAW_HTML_DIR, RAW_META_DIR, ensure_dirs, fetch, extract_links, append_jsonl,
-    normalize_url, is_same_domain, is_allowed_path, get_robots_parser,
-    sha256_bytes, safe_filename_from_url, polite_wait, apply_runtime_config, get_headers
+    RAW_HTML_DIR, RAW_META_DIR, ensure_dirs, fetch, extract_links, append_jsonl, read_jsonl,
+    normalize_url, is_same_domain, is_allowed_path, get_robots_parser, write_text_atomic,
+    sha256_bytes, safe_filename_from_url, host_wait, apply_runtime_config, get_headers
 )
+from src.utils.html_parse import parse_file_cached
+
+FRONTIER_DIR = os.path.join(RAW_META_DIR, "frontier")
+FRONTIER_SAVE_EVERY = 25  # pages between frontier checkpoints
 
 @dataclass
 class CrawlState:
+    """
+    Shared by the workers of one target. `active` pages are reserved against
+    max_pages so concurrent workers never overshoot it, and are put back on
+    the frontier when a checkpoint is taken mid-fetch. Setting `stop` makes
+    workers finish their current page and exit.
+    """
     visited: Set[str] = field(default_factory=set)
     count: int = 0
+    active: Dict[str, int] = field(default_factory=dict)
+    frontier: Deque[Tuple[str, int]] = field(default_factory=deque)
+    cond: threading.Condition = field(default_factory=threading.Condition)
+    stop: threading.Event = field(default_factory=threading.Event)
+
+# ---------- Frontier persistence ----------
+def _frontier_path(base_host: str) -> str:
+    return os.path.join(FRONTIER_DIR, f"{safe_filename_from_url('//' + base_host)}.json")
+
+def save_frontier(state: CrawlState, path: str):
+    with state.cond:
+        snapshot = {
+            "count": state.count,
+            "frontier": list(state.active.items()) + list(state.frontier),
+            "visited": sorted(state.visited - state.active.keys()),
+        }
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    write_text_atomic(path, json.dumps(snapshot))
+
+def load_frontier(path: str) -> Optional[CrawlState]:
+    if not os.path.exists(path):
+        return None
+    with open(path, "r", encoding="utf-8") as f:
+        snap = json.load(f)
+    state = CrawlState(visited=set(snap["visited"]), count=int(snap["count"]))
+    state.frontier.extend((u, int(d)) for u, d in snap["frontier"])
+    return state
+
+# ---------- Revalidation ----------
+def load_validators(log_path: str) -> Dict[str, Dict]:
+    """
+    Latest logged record per URL (carries etag / last_modified / path / sha256).
+    """
+    latest: Dict[str, Dict] = {}
+    for rec in read_jsonl(log_path):
+        if rec.get("type") == "html" and rec.get("url"):
+            latest[rec["url"]] = rec
+    return latest
+
+def _conditional_headers(prev: Optional[Dict]) -> Dict[str, str]:
+    if not prev or not prev.get("path") or not os.path.exists(prev["path"]):
+        return {}
+    headers = {}
+    if prev.get("etag"):
+        headers["If-None-Match"] = prev["etag"]
+    if prev.get("last_modified"):
+        headers["If-Modified-Since"] = prev["last_modified"]
+    return headers
+
+# ---------- Crawl loop ----------
+def _claim(state: CrawlState, max_pages: int, accept) -> Optional[Tuple[str, int]]:
+    """
+    Pop the next crawlable (url, depth), or None once the crawl is finished.
+    """
+    with state.cond:
+        while True:
+            if state.stop.is_set() or state.count >= max_pages:
+                return None
+            if state.frontier and state.count + len(state.active) < max_pages:
+                url, depth = state.frontier.popleft()
+                if url in state.visited:
+                    continue
+                state.visited.add(url)
+                if not accept(url):
+                    continue
+                state.active[url] = depth
+                return url, depth
+            if not state.frontier and not state.active:
+                state.cond.notify_all()
+                return None
+            state.cond.wait(timeout=0.5)  # wakes on releases; the timeout notices `stop`
+
+def _release(state: CrawlState, url: str, crawled: bool, links: List[Tuple[str, int]]) -> int:
+    with state.cond:
+        state.active.pop(url, None)
+        if crawled:
+            state.count += 1
+        state.frontier.extend(links)
+        state.cond.notify_all()
+        return state.count
+
+def _crawl_page(url: str, depth: int, log_path: str, prev: Optional[Dict]):
+    """
+    Fetch (conditionally, if we have validators) + save one page.
+    Returns the page's links, or None if nothing was crawled.
+    A 304 reuses the stored file without rewriting it.
+    """
+    host_wait(url)
+    resp = fetch(url, headers=_conditional_headers(prev))
+    if not resp:
+        return None
+
+    if resp.status_code == 304 and prev:
+        page = parse_file_cached(prev["path"], prev.get("sha256"))
+        print(f"UNCHANGED HTML: {url}")
+        append_jsonl(log_path, {
+            **{k: prev.get(k) for k in ("path", "sha256", "content_type", "etag", "last_modified")},
+            "type": "html",
+            "url": url,
+            "status": 304,
+            "unchanged": True,
+            "fetched_at": int(time.time()),
+            "depth": depth,
+        })
+        return page.links(url) if page else []
 
-def crawl_domain(target: Dict[str, Any], limits: Dict[str, int]):
+    if resp.status_code != 200:
+        return None
+
+    ctype = (resp.headers.get("Content-Type") or "").lower()
+    if "text/html" not in ctype and not resp.text.strip().lower().startswith("<!doctype html"):
+        return None
+
+    html = resp.text
+    digest = sha256_bytes(html.encode("utf-8", errors="ignore"))
+    fname = safe_filename_from_url(url, ".html")
+    out_path = os.path.join(RAW_HTML_DIR, fname)
+    if not os.path.exists(out_path) or not prev or prev.get("sha256") != digest:
+        write_text_atomic(out_path, html)
+    print(f"SAVED HTML: {url} -> {out_path}")
+
+    append_jsonl(
+        log_path,
+        {
+            "type": "html",
+            "url": url,
+            "path": out_path,
+            "sha256": digest,
+            "status": resp.status_code,
+            "content_type": ctype,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
+            "fetched_at": int(time.time()),
+            "depth": depth,
+        },
+    )
+    # parse once, cached by sha256 for the PDF collector and the chunker
+    return extract_links(html, url, sha256=digest)
+
+def crawl_domain(target: Dict[str, Any], limits: Dict[str, int], resume: bool = True,
+                 stop: Optional[threading.Event] = None):
     base: str = target["base"]
     allow_paths: List[str] = target["allow_paths"]
     start_urls: List[str] = target["start_urls"]
     max_depth = limits["max_depth"]
     max_pages = limits["max_pages"]
+    workers = max(1, limits.get("workers", 1))
 
     rp = get_robots_parser(base)
     base_host = up.urlparse(base).netloc
-    state = CrawlState()
-    q = queue.Queue()
-    for u in start_urls:
-        q.put((normalize_url(u), 0))
-
-    while not q.empty() and state.count < max_pages:
-        url, depth = q.get()
-        if url in state.visited:
-            continue
-        state.visited.add(url)
-
-        if not is_same_domain(url, base) or not is_allowed_path(url, allow_paths):
-            continue
-        if not rp.can_fetch(get_headers()["User-Agent"], url):
-            continue
-
-        polite_wait()
-        resp = fetch(url)
-        if not resp or resp.status_code != 200:
-            continue
-
-        ctype = (resp.headers.get("Content-Type") or "").lower()
-        if "text/html" not in ctype and not resp.text.strip().lower().startswith("<!doctype html"):
-            continue
-
-        html = resp.text
-        digest = sha256_bytes(html.encode("utf-8", errors="ignore"))
-        fname = safe_filename_from_url(url, ".html")
-        out_path = os.path.join(RAW_HTML_DIR, fname)
-        if not os.path.exists(out_path):
-            with open(out_path, "w", encoding="utf-8") as f:
-                f.write(html)
-        print(f"SAVED HTML: {url} -> {out_path}")
-
-        append_jsonl(
-            os.path.join(RAW_META_DIR, f"{base_host}.jsonl"),
-            {
-                "type": "html",
-                "url": url,
-                "path": out_path,
-                "sha256": digest,
-                "status": resp.status_code,
-                "content_type": ctype,
-                "fetched_at": int(time.time()),
-                "depth": depth,
-            },
-        )
-
-        if depth < max_depth:
-            for link in extract_links(html, url):
-                if link not in state.visited and is_same_domain(link, base) and is_allowed_path(link, allow_paths):
-                    q.put((link, depth + 1))
-
-        state.count += 1
-
-def main(config_path: str = "configs/crawler.yaml"):
+    log_path = os.path.join(RAW_META_DIR, f"{base_host}.jsonl")
+    frontier_path = _frontier_path(base_host)
+    validators = load_validators(log_path)
+
+    state = load_frontier(frontier_path) if resume else None
+    if state is not None:
+        print(f"[OK] {base_host}: resuming ({state.count} done, {len(state.frontier)} queued)")
+    else:
+        state = CrawlState()
+        for u in start_urls:
+            state.frontier.append((normalize_url(u), 0))
+    if stop is not None:
+        state.stop = stop
+
+    def allowed(url: str) -> bool:
+        return is_same_domain(url, base) and is_allowed_path(url, allow_paths)
+
+    def accept(url: str) -> bool:
+        return allowed(url) and rp.can_fetch(get_headers()["User-Agent"], url)
+
+    def worker():
+        while True:
+            item = _claim(state, max_pages, accept)
+            if item is None:
+                return
+            url, depth = item
+            links = None
+            try:
+                links = _crawl_page(url, depth, log_path, validators.get(url))
+            except Exception as e:
+                print(f"[ERR] {url}: {e}")
+            finally:
+                next_links = []
+                if links is not None and depth < max_depth:
+                    next_links = [(l, depth + 1) for l in links if l not in state.visited and allowed(l)]
+                done = _release(state, url, links is not None, next_links)
+                if links is not None and done % FRONTIER_SAVE_EVERY == 0:
+                    save_frontier(state, frontier_path)
+
+    threads = [threading.Thread(target=worker, name=f"crawl-{base_host}-{i}") for i in range(workers)]
+    try:
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+    except BaseException:
+        # interrupted: stop claiming pages, let in-flight fetches finish, then
+        # checkpoint so the next run resumes exactly here
+        with state.cond:
+            state.stop.set()
+            state.cond.notify_all()
+        try:
+            for t in threads:
+                if t.is_alive():
+                    t.join()
+        finally:
+            save_frontier(state, frontier_path)
+        raise
+    if state.stop.is_set():
+        # stopped from main(): keep the checkpoint instead of finishing
+        save_frontier(state, frontier_path)
+        print(f"[OK] {base_host}: stopped after {state.count} pages; frontier saved")
+        return
+    if os.path.exists(frontier_path):
+        os.remove(frontier_path)
+    print(f"[OK] {base_host}: {state.count} pages")
+
+def main(config_path: str = "configs/crawler.yaml", resume: bool = True):
     cfg = load_config(config_path)
     c = get_crawler_cfg(cfg)
-    apply_runtime_config(c.user_agent, c.throttle_seconds, c.request_timeout)
+    apply_runtime_config(c.user_agent, c.throttle_seconds, c.request_timeout, pool_size=c.workers_per_host)
     ensure_dirs()
 
-    for target in cfg.get("targets", []):
-        crawl_domain(target, {"max_depth": c.max_depth, "max_pages": c.max_pages})
+    # each target is its own host, so targets crawl in parallel under their own rate limits
+    limits = {"max_depth": c.max_depth, "max_pages": c.max_pages, "workers": c.workers_per_host}
+    targets = cfg.get("targets", [])
+    stop = threading.Event()
+    with ThreadPoolExecutor(max_workers=max(1, len(targets))) as pool:
+        futures = [pool.submit(crawl_domain, t, limits, resume, stop) for t in targets]
+        try:
+            for fut in futures:
+                fut.result()
+        except BaseException:
+            # Ctrl-C lands in this thread, not in the crawls: stop them; leaving
+            # the pool waits until every target has saved its frontier
+            stop.set()
+            raise
     print("HTML crawl complete.")
 
 if __name__ == "__main__":
@@ -1,12 +1,20 @@
-import os, time, json, glob, urllib.parse as up
-from typing import List, Dict, Any
+import os, time, json, glob, hashlib, threading, urllib.parse as up
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Dict, Any, Optional
 
 from src.utils.config import load_config, get_crawler_cfg
 from src.utils.helpers import (
-    RAW_HTML_DIR, RAW_PDF_DIR, RAW_META_DIR, ensure_dirs, fetch, append_jsonl,
-    extract_links, is_allowed_path, looks_like_pdf, polite_wait,
-    sha256_bytes, safe_filename_from_url, apply_runtime_config
+    RAW_HTML_DIR, RAW_PDF_DIR, RAW_META_DIR, ensure_dirs, fetch, append_jsonl, read_jsonl,
+    is_allowed_path, looks_like_pdf, host_wait,
+    safe_filename_from_url, apply_runtime_config
 )
+from src.utils.html_parse import parse_file_cached
+
+STREAM_CHUNK = 1 << 16          # 64 KiB per read/hash update
+MAX_DOWNLOAD_WORKERS = 16
+
+_HOST_SLOTS: Dict[str, threading.BoundedSemaphore] = {}
+_SLOTS_LOCK = threading.Lock()
 
 def iter_html_records_from_logs():
     for log_path in glob.glob(os.path.join(RAW_META_DIR, "*.jsonl")):
@@ -18,7 +26,7 @@ def iter_html_records_from_logs():
                 except json.JSONDecodeError:
                     continue
                 if rec.get("type") == "html" and "url" in rec and "path" in rec:
-                    yield rec["url"], rec["path"], host
+                    yield rec["url"], rec["path"], host, rec.get("sha256")
 
 def allowed_pdf(url: str, allowed_map: Dict[str, List[str]]) -> bool:
     host = up.urlparse(url).netloc
@@ -30,14 +38,13 @@ def allowed_pdf(url: str, allowed_map: Dict[str, List[str]]) -> bool:
 def collect_pdf_links(allowed_map: Dict[str, List[str]]) -> List[str]:
     pdf_urls = set()
     count_pages = 0
-    for page_url, html_path, host in iter_html_records_from_logs():
+    for page_url, html_path, host, sha256 in iter_html_records_from_logs():
         count_pages += 1
-        try:
-            with open(html_path, "r", encoding="utf-8") as f:
-                html = f.read()
-        except FileNotFoundError:
+        # reuses the crawler's parse when the sha256 is cached
+        page = parse_file_cached(html_path, sha256)
+        if page is None:
             continue
-        for link in extract_links(html, base_url=page_url):
+        for link in page.links(page_url):
             if looks_like_pdf(link) and allowed_pdf(link, allowed_map):
                 pdf_urls.add(link)
     print(f"Scanned {count_pages} HTML pages; found {len(pdf_urls)} PDF links.")
@@ -45,25 +52,153 @@ def collect_pdf_links(allowed_map: Dict[str, List[str]]) -> List[str]:
         print("PDF CANDIDATE:", u)
     return sorted(pdf_urls)
 
-def download_pdf(url: str, allowed_map: Dict[str, List[str]]):
-    import urllib.parse as up
+def load_pdf_validators() -> Dict[str, Dict]:
+    """
+    Latest logged PDF record per URL (etag / last_modified / size_bytes / path).
+    """
+    latest: Dict[str, Dict] = {}
+    for log_path in glob.glob(os.path.join(RAW_META_DIR, "*.jsonl")):
+        for rec in read_jsonl(log_path):
+            if rec.get("type") == "pdf" and rec.get("url"):
+                latest[rec["url"]] = rec
+    return latest
+
+def _host_slot(url: str, size: int) -> threading.BoundedSemaphore:
+    host = up.urlparse(url).netloc
+    with _SLOTS_LOCK:
+        if host not in _HOST_SLOTS:
+            _HOST_SLOTS[host] = threading.BoundedSemaphore(size)
+        return _HOST_SLOTS[host]
+
+def _unchanged(resp, prev: Optional[Dict], out_path: str) -> bool:
+    """
+    True if the response describes the file we already have.
+    """
+    if not prev or not os.path.exists(out_path):
+        return False
+    if resp.status_code == 304:
+        return True
+    etag = resp.headers.get("ETag")
+    if etag and prev.get("etag"):
+        return etag == prev["etag"]
+    length = resp.headers.get("Content-Length")
+    return (
+        resp.status_code == 200 and length is not None and prev.get("size_bytes") is not None
+        and int(length) == prev["size_bytes"] == os.path.getsize(out_path)
+    )
+
+def _part_validator(part_path: str) -> Optional[str]:
+    """
+    If-Range value for resuming part_path: the strong ETag (else Last-Modified)
+    of the response that wrote it, saved next to it as <part>.json.
+    """
+    meta_path = part_path + ".json"
+    if not os.path.exists(meta_path):
+        return None
+    try:
+        with open(meta_path, "r", encoding="utf-8") as f:
+            meta = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+    etag = meta.get("etag")
+    if etag and not etag.startswith("W/"):  # If-Range needs a strong validator
+        return etag
+    return meta.get("last_modified")
+
+def _save_part_validator(resp, part_path: str):
+    with open(part_path + ".json", "w", encoding="utf-8") as f:
+        json.dump({"etag": resp.headers.get("ETag"), "last_modified": resp.headers.get("Last-Modified")}, f)
+
+def _drop_part(part_path: str):
+    for path in (part_path, part_path + ".json"):
+        if os.path.exists(path):
+            os.remove(path)
+
+def _range_start(resp) -> Optional[int]:
+    # "Content-Range: bytes 1000-1999/2000" -> 1000
+    value = resp.headers.get("Content-Range") or ""
+    try:
+        return int(value.split()[1].split("-")[0])
+    except (IndexError, ValueError):
+        return None
+
+def _stream_to_file(resp, part_path: str, resume_from: int):
+    """
+    Append (206) or write (200) the body to part_path, hashing as it streams.
+    Returns (sha256 hex, total bytes).
+    """
+    h = hashlib.sha256()
+    mode = "wb"
+    total = 0
+    if resume_from and resp.status_code == 206:
+        # bytes already on disk are part of the digest too
+        with open(part_path, "rb") as f:
+            for block in iter(lambda: f.read(STREAM_CHUNK), b""):
+                h.update(block)
+        mode = "ab"
+        total = resume_from
+    with open(part_path, mode) as f:
+        for block in resp.iter_content(chunk_size=STREAM_CHUNK):
+            if block:
+                f.write(block)
+                h.update(block)
+                total += len(block)
+    return h.hexdigest(), total
+
+def download_pdf(url: str, allowed_map: Dict[str, List[str]], prev: Optional[Dict] = None):
     host = up.urlparse(url).netloc
     if not allowed_pdf(url, allowed_map):
         return
-    polite_wait()
-    resp = fetch(url)
-    if not resp or resp.status_code != 200:
-        return
-    ctype = (resp.headers.get("Content-Type") or "").lower()
-    if "pdf" not in ctype and not looks_like_pdf(url):
-        return
-    data = resp.content
-    digest = sha256_bytes(data)
     fname = safe_filename_from_url(url, ".pdf")
     out_path = os.path.join(RAW_PDF_DIR, fname)
-    if not os.path.exists(out_path):
-        with open(out_path, "wb") as f:
-            f.write(data)
+    part_path = out_path + ".part"
+
+    headers: Dict[str, str] = {}
+    if prev and os.path.exists(out_path):
+        if prev.get("etag"):
+            headers["If-None-Match"] = prev["etag"]
+        if prev.get("last_modified"):
+            headers["If-Modified-Since"] = prev["last_modified"]
+    resume_from = os.path.getsize(part_path) if os.path.exists(part_path) else 0
+    validator = _part_validator(part_path) if resume_from else None
+    if validator:
+        # the server sends the rest only if the file is still the version the
+        # partial came from; otherwise a full 200 replaces it
+        headers["Range"] = f"bytes={resume_from}-"
+        headers["If-Range"] = validator
+    elif resume_from:
+        # no way to tell which version the partial belongs to: start over
+        _drop_part(part_path)
+        resume_from = 0
+
+    host_wait(url)
+    resp = fetch(url, headers=headers, stream=True)
+    if not resp:
+        return
+    try:
+        if _unchanged(resp, prev, out_path):
+            print(f"UNCHANGED PDF: {url}")
+            _drop_part(part_path)
+            return
+        if resp.status_code == 416 or (resp.status_code == 206 and _range_start(resp) != resume_from):
+            # partial no longer lines up with the remote file; next run starts over
+            print(f"[ERR] {url}: cannot resume from byte {resume_from}; dropped partial download")
+            _drop_part(part_path)
+            return
+        if resp.status_code not in (200, 206):
+            return
+        ctype = (resp.headers.get("Content-Type") or "").lower()
+        if "pdf" not in ctype and not looks_like_pdf(url):
+            return
+        if resp.status_code == 200:
+            _save_part_validator(resp, part_path)  # what a later resume must match
+        digest, size = _stream_to_file(resp, part_path, resume_from)
+    finally:
+        resp.close()
+
+    os.replace(part_path, out_path)
+    _drop_part(part_path)
+    print(f"SAVED PDF: {url} -> {out_path} ({size} bytes)")
     append_jsonl(
         os.path.join(RAW_META_DIR, f"{host}.jsonl"),
         {
@@ -73,14 +208,35 @@ def download_pdf(url: str, allowed_map: Dict[str, List[str]]):
             "sha256": digest,
             "status": resp.status_code,
             "content_type": ctype,
+            "size_bytes": size,
+            "etag": resp.headers.get("ETag"),
+            "last_modified": resp.headers.get("Last-Modified"),
             "fetched_at": int(time.time()),
         },
     )
 
+def download_all(urls: List[str], allowed_map: Dict[str, List[str]], per_host: int):
+    """
+    Download concurrently: at most `per_host` transfers per host at a time,
+    with request starts paced by the per-host token bucket.
+    """
+    validators = load_pdf_validators()
+
+    def one(url: str):
+        with _host_slot(url, per_host):
+            try:
+                download_pdf(url, allowed_map, validators.get(url))
+            except Exception as e:  # a .part file stays behind for resume
+                print(f"[ERR] {url}: {e}")
+
+    hosts = {up.urlparse(u).netloc for u in urls}
+    with ThreadPoolExecutor(max_workers=max(1, min(MAX_DOWNLOAD_WORKERS, per_host * len(hosts)))) as pool:
+        list(pool.map(one, sorted(urls)))
+
 def main(config_path: str = "configs/crawler.yaml"):
     cfg = load_config(config_path)
     c = get_crawler_cfg(cfg)
-    apply_runtime_config(c.user_agent, c.throttle_seconds, c.request_timeout)
+    apply_runtime_config(c.user_agent, c.throttle_seconds, c.request_timeout, pool_size=c.workers_per_host)
     ensure_dirs()
 
     allowed_map = cfg.get("pdf_allowed_hosts", {})
@@ -88,8 +244,7 @@ def main(config_path: str = "configs/crawler.yaml"):
     urls.update(collect_pdf_links(allowed_map))
 
     print(f"Found {len(urls)} candidate PDF links.")
-    for u in urls:
-        download_pdf(u, allowed_map)
+    download_all(sorted(urls), allowed_map, per_host=c.workers_per_host)
     print("PDF collection complete.")
 
 if __name__ == "__main__":
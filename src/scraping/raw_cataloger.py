@@ -1,50 +1,38 @@
 # src/scraping/raw_cataloger.py
-import os, glob, json, time
-from typing import Dict
+import os, glob, json, time, hashlib
+from concurrent.futures import ProcessPoolExecutor
+from typing import Dict, List, Tuple
 
 from src.utils.helpers import (
-    RAW_HTML_DIR, RAW_PDF_DIR, RAW_META_DIR, ensure_dirs,
-    sha256_bytes, append_jsonl
+    RAW_HTML_DIR, RAW_PDF_DIR, RAW_META_DIR, ensure_dirs, read_jsonl
 )
 
+HASH_CHUNK = 1 << 20  # 1 MiB reads; large PDFs never sit in memory whole
+HASH_WORKERS = os.cpu_count() or 1
+
 def file_sha256(path: str) -> str:
+    h = hashlib.sha256()
     with open(path, "rb") as f:
-        return sha256_bytes(f.read())
+        for block in iter(lambda: f.read(HASH_CHUNK), b""):
+            h.update(block)
+    return h.hexdigest()
 
 def file_info(path: str) -> Dict:
     st = os.stat(path)
     return {
         "size_bytes": st.st_size,
         "mtime": int(st.st_mtime),
+        "mtime_ns": st.st_mtime_ns,  # reuse check: a same-size rewrite within a second changes only this
     }
 
-def build_path_to_url_map() -> Dict[str, str]:
+def build_log_maps() -> Tuple[Dict[str, str], Dict[str, Dict]]:
     """
-    Read all per-host logs in data/raw/metadata/*.jsonl and map saved file path -> source URL.
-    Skips the combined manifest file.
+    Single pass over the per-host logs in data/raw/metadata/*.jsonl (manifest skipped).
+    Returns:
+      path2url:  normalized raw file path -> source URL
+      path2meta: normalized raw file path -> {"source_url": <url>, "raw_id": "<host>.jsonl:<line_no>"}
     """
     path2url: Dict[str, str] = {}
-    for log_path in glob.glob(os.path.join(RAW_META_DIR, "*.jsonl")):
-        host = os.path.splitext(os.path.basename(log_path))[0]
-        if host == "manifest":
-            continue
-        with open(log_path, "r", encoding="utf-8") as f:
-            for line in f:
-                try:
-                    rec = json.loads(line)
-                except json.JSONDecodeError:
-                    continue
-                p = rec.get("path")
-                u = rec.get("url")
-                if p and u:
-                    path2url[os.path.normpath(p)] = u
-    return path2url
-
-def build_log_meta_map() -> Dict[str, Dict]:
-    """
-    Map normalized raw file path -> {"source_url": <url>, "raw_id": "<host>.jsonl:<line_no>"}.
-    Uses per-domain crawl logs in data/raw/metadata/*.jsonl. Skips manifest.
-    """
     path2meta: Dict[str, Dict] = {}
     for log_path in glob.glob(os.path.join(RAW_META_DIR, "*.jsonl")):
         host = os.path.splitext(os.path.basename(log_path))[0]
@@ -61,50 +49,113 @@ def build_log_meta_map() -> Dict[str, Dict]:
                 if not p:
                     continue
                 norm = os.path.normpath(p)
+                if u:
+                    path2url[norm] = u
                 path2meta[norm] = {
                     "source_url": u,
                     "raw_id": f"{host}.jsonl:{i}",
                 }
-    return path2meta
+    return path2url, path2meta
+
+def build_path_to_url_map() -> Dict[str, str]:
+    """
+    Map saved file path -> source URL from the per-host crawl logs.
+    """
+    return build_log_maps()[0]
+
+def build_log_meta_map() -> Dict[str, Dict]:
+    """
+    Map normalized raw file path -> {"source_url": <url>, "raw_id": "<host>.jsonl:<line_no>"}.
+    """
+    return build_log_maps()[1]
+
+def load_manifest(manifest_path: str) -> Dict[str, Dict]:
+    return {rec["path"]: rec for rec in read_jsonl(manifest_path) if "path" in rec}
+
+def load_hash_index(index_path: str) -> Dict[str, Dict]:
+    """
+    path -> {"size_bytes", "mtime", "mtime_ns", "sha256"} for every raw file seen last run,
+    including duplicates the manifest leaves out.
+    """
+    if not os.path.exists(index_path):
+        return {}
+    try:
+        with open(index_path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except json.JSONDecodeError:
+        return {}
+
+def _write_atomic(path: str, write):
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "w", encoding="utf-8") as f:
+        write(f)
+    os.replace(tmp_path, path)
+
+def _hash_files(paths: List[str]) -> Dict[str, str]:
+    if not paths:
+        return {}
+    if len(paths) == 1 or HASH_WORKERS == 1:
+        return {p: file_sha256(p) for p in paths}
+    with ProcessPoolExecutor(max_workers=min(HASH_WORKERS, len(paths))) as pool:
+        return dict(zip(paths, pool.map(file_sha256, paths, chunksize=8)))
 
 def main():
     ensure_dirs()
     manifest_path = os.path.join(RAW_META_DIR, "manifest.jsonl")
-    if os.path.exists(manifest_path):
-        os.remove(manifest_path)
+    index_path = os.path.join(RAW_META_DIR, "hash_index.json")
+    prior = load_manifest(manifest_path)
+    known = load_hash_index(index_path)
+    path2url, _ = build_log_maps()
 
-    path2url = build_path_to_url_map()
-    seen_hashes = set()
-    total = 0
+    files: List[Tuple[str, str]] = (
+        [("html", os.path.normpath(fp)) for fp in sorted(glob.glob(os.path.join(RAW_HTML_DIR, "*.html")))]
+        + [("pdf", os.path.normpath(fp)) for fp in sorted(glob.glob(os.path.join(RAW_PDF_DIR, "*.pdf")))]
+    )
+
+    # reuse prior hashes when size + mtime (ns) are unchanged; hash the rest in parallel
+    infos = {fp: file_info(fp) for _, fp in files}
+    hashes: Dict[str, str] = {}
+    to_hash: List[str] = []
+    for _, fp in files:
+        old = known.get(fp) or prior.get(fp)
+        info = infos[fp]
+        if old and old.get("size_bytes") == info["size_bytes"] and old.get("mtime_ns") == info["mtime_ns"]:
+            hashes[fp] = old["sha256"]
+        else:
+            to_hash.append(fp)
+    reused = len(hashes)
+    hashes.update(_hash_files(to_hash))
 
-    def emit(kind: str, fp: str):
-        nonlocal total
-        norm_fp = os.path.normpath(fp)
-        h = file_sha256(norm_fp)
+    now = int(time.time())
+    seen_hashes = set()
+    records: List[Dict] = []
+    for kind, fp in files:
+        old = prior.get(fp)
+        h = hashes[fp]
         if h in seen_hashes:
-            return
+            continue
         seen_hashes.add(h)
-        info = file_info(norm_fp)
         rec = {
             "kind": kind,
-            "path": norm_fp,
+            "path": fp,
             "sha256": h,
-            "seen_at": int(time.time()),
-            "size_bytes": info["size_bytes"],
-            "mtime": info["mtime"],
+            "seen_at": old.get("seen_at", now) if old and old.get("sha256") == h else now,
+            "size_bytes": infos[fp]["size_bytes"],
+            "mtime": infos[fp]["mtime"],
         }
         # attach source URL if we have it (from crawl logs)
-        if norm_fp in path2url:
-            rec["source_url"] = path2url[norm_fp]
-        append_jsonl(manifest_path, rec)
-        total += 1
+        if fp in path2url:
+            rec["source_url"] = path2url[fp]
+        records.append(rec)
 
-    for fp in glob.glob(os.path.join(RAW_HTML_DIR, "*.html")):
-        emit("html", fp)
-    for fp in glob.glob(os.path.join(RAW_PDF_DIR, "*.pdf")):
-        emit("pdf", fp)
+    # atomic replace: readers never see a partial manifest
+    _write_atomic(manifest_path, lambda f: f.writelines(json.dumps(r, ensure_ascii=False) + "\n" for r in records))
+    _write_atomic(index_path, lambda f: json.dump(
+        {fp: {**infos[fp], "sha256": hashes[fp]} for _, fp in files}, f
+    ))
 
-    print(f"Manifest built: {manifest_path} ({total} records)")
+    print(f"Manifest built: {manifest_path} ({len(records)} records; "
+          f"{reused} hashes reused, {len(to_hash)} files hashed)")
 
 if __name__ == "__main__":
     main()
@@ -0,0 +1,113 @@
+# src/utils/bench_guardrails.py
+# Compiled guardrails vs the per-rule approach they replace (one re.sub per PII
+# pattern, then `kw in query.lower()` per keyword) on a synthetic query set.
+# --extra-keywords grows the blocklist with random keywords to show how each
+# approach scales with the number of rules.
+#
+#   python -m src.utils.bench_guardrails --queries 100000 --extra-keywords 0 500 5000
+
+import argparse
+import random
+import re
+import string
+import time
+from typing import Dict, List
+
+from src.utils.guardrails import HAS_AHOCORASICK, Guardrails, load_guardrails_cfg
+
+WORDS = (
+    "how do I set up zelle on my checking account what is the range of the lucid air "
+    "charging at home tire pressure warning light mobile deposit failed routing number "
+    "overdraft fees debit card declined bluetooth pairing software update dreamdrive "
+    "statement transfer savings interest wire international key fob battery warranty"
+).split()
+
+
+def _pii(rng: random.Random) -> str:
+    kind = rng.randrange(5)
+    if kind == 0:
+        return f"{rng.choice(WORDS)}.{rng.randint(1, 999)}@example.com"
+    if kind == 1:
+        return f"({rng.randint(200, 999)}) {rng.randint(200, 999)}-{rng.randint(0, 9999):04d}"
+    if kind == 2:
+        return " ".join(f"{rng.randint(0, 9999):04d}" for _ in range(4))
+    if kind == 3:
+        return "".join(rng.choice("ABCDEFGHJKLMNPRSTUVWXYZ0123456789") for _ in range(16)) + str(rng.randint(0, 9))
+    return str(rng.randint(10**9, 10**12))
+
+
+def synthetic_queries(n: int, blocked: List[str], seed: int = 0) -> List[str]:
+    """
+    Domain-like queries of 6-40 words; ~15% carry PII, ~2% a blocked keyword.
+    """
+    rng = random.Random(seed)
+    out = []
+    for _ in range(n):
+        words = [rng.choice(WORDS) for _ in range(rng.randint(6, 40))]
+        if rng.random() < 0.15:
+            words.insert(rng.randrange(len(words)), _pii(rng))
+        if blocked and rng.random() < 0.02:
+            words.insert(rng.randrange(len(words)), rng.choice(blocked))
+        out.append(" ".join(words))
+    return out
+
+
+def with_extra_keywords(cfg: Dict, n: int, seed: int = 0) -> Dict:
+    rng = random.Random(seed)
+    extra = ["".join(rng.choice(string.ascii_lowercase) for _ in range(rng.randint(5, 12))) for _ in range(n)]
+    return {**cfg, "blocklist": {**(cfg.get("blocklist") or {}), "synthetic": extra}}
+
+
+def naive_guardrails(cfg: Dict):
+    rules = [(rule["pattern"], rule["replace"]) for rule in (cfg.get("pii") or {}).values()]
+    keywords = [kw for words in (cfg.get("blocklist") or {}).values() for kw in words or []]
+    blocked_reply = cfg.get("blocked_reply", "[BLOCKED_QUERY]")
+
+    def apply(query: str) -> str:
+        for pattern, replace in rules:
+            query = re.sub(pattern, replace, query)
+        if any(kw in query.lower() for kw in keywords):
+            return blocked_reply
+        return query
+
+    return apply
+
+
+def _time(fn, queries: List[str]) -> Dict:
+    t0 = time.perf_counter()
+    out = [fn(q) for q in queries]
+    secs = time.perf_counter() - t0
+    return {"us_per_query": secs / len(queries) * 1e6, "qps": len(queries) / secs, "outputs": out}
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--queries", type=int, default=100_000)
+    parser.add_argument("--extra-keywords", type=int, nargs="+", default=[0, 500, 5000])
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    base = load_guardrails_cfg()
+    blocked = [kw for words in (base.get("blocklist") or {}).values() for kw in words or []]
+    queries = synthetic_queries(args.queries, blocked, args.seed)
+    print(f"[OK] {len(queries)} synthetic queries | automaton: {'pyahocorasick' if HAS_AHOCORASICK else 'pure python'}")
+
+    for n in args.extra_keywords:
+        cfg = with_extra_keywords(base, n, args.seed)
+        n_rules = len(cfg.get("pii") or {}) + sum(len(w or []) for w in cfg["blocklist"].values())
+        t0 = time.perf_counter()
+        compiled = Guardrails(cfg)
+        build_ms = (time.perf_counter() - t0) * 1000
+
+        old = _time(naive_guardrails(cfg), queries)
+        new = _time(compiled.apply, queries)
+        differ = sum(a != b for a, b in zip(old["outputs"], new["outputs"]))
+        print(
+            f"[OK] {n_rules:5d} rules | per-rule {old['us_per_query']:7.1f} us/q ({old['qps']:8.0f} q/s) "
+            f"| compiled {new['us_per_query']:7.1f} us/q ({new['qps']:8.0f} q/s) "
+            f"| x{old['us_per_query'] / new['us_per_query']:.1f} | build {build_ms:.0f} ms | {differ} outputs differ"
+        )
+
+
+if __name__ == "__main__":
+    main()
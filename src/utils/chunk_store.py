@@ -0,0 +1,139 @@
+# src/utils/chunk_store.py
+# Columnar chunk store (Parquet via pyarrow).
+# Repeated metadata (domain, doc_type, title, source_url, file_path, ...) is
+# dictionary-encoded, so each distinct value is stored once per row group.
+# Readers stream memory-mapped record batches and project only the columns they need.
+# all_chunks.jsonl is still written next to it for debugging.
+
+import os
+from typing import Dict, Iterable, Iterator, List, Optional, Sequence
+
+try:
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+    HAS_ARROW = True
+except ImportError:
+    HAS_ARROW = False
+
+CHUNK_STORE_PATH = os.getenv("CHUNK_STORE_PATH", "data/processed/chunks/all_chunks.parquet")
+ROW_GROUP_SIZE = int(os.getenv("CHUNK_ROW_GROUP_SIZE", "8192"))
+READ_BATCH_SIZE = 4096
+
+# low-cardinality columns (one value per document or per site)
+DICT_COLUMNS = ["domain", "doc_type", "title", "source_url", "file_path", "section", "sha256", "raw_id"]
+COLUMNS = ["chunk_id", "text"] + DICT_COLUMNS + ["page_no"]
+
+
+def _schema() -> "pa.Schema":
+    dict_str = pa.dictionary(pa.int32(), pa.string())
+    fields = [pa.field("chunk_id", pa.string()), pa.field("text", pa.string())]
+    fields += [pa.field(name, dict_str) for name in DICT_COLUMNS]
+    fields.append(pa.field("page_no", pa.int32()))
+    return pa.schema(fields)
+
+
+def _require_arrow():
+    if not HAS_ARROW:
+        raise ImportError("pyarrow is required for the columnar chunk store (pip install pyarrow)")
+
+
+class ChunkStoreWriter:
+    """
+    Buffered Parquet writer; one row group per ROW_GROUP_SIZE rows.
+    Writes to <path>.tmp and swaps it in on close, so readers never see a partial file.
+    """
+
+    def __init__(self, path: str = CHUNK_STORE_PATH, row_group_size: int = ROW_GROUP_SIZE):
+        _require_arrow()
+        self.path = path
+        self.tmp_path = path + ".tmp"
+        self.row_group_size = row_group_size
+        self.rows_written = 0
+        self._buf: List[Dict] = []
+        self._schema = _schema()
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        self._writer = pq.ParquetWriter(
+            self.tmp_path, self._schema, compression="zstd", use_dictionary=DICT_COLUMNS,
+        )
+
+    def write(self, rows: Iterable[Dict]):
+        self._buf.extend(rows)
+        if len(self._buf) >= self.row_group_size:
+            self._flush()
+
+    def _flush(self):
+        if not self._buf:
+            return
+        arrays = []
+        for field in self._schema:
+            values = [r.get(field.name) for r in self._buf]
+            if field.name in DICT_COLUMNS:
+                arrays.append(pa.array(values, type=pa.string()).dictionary_encode())
+            else:
+                arrays.append(pa.array(values, type=field.type))
+        self._writer.write_table(pa.Table.from_arrays(arrays, schema=self._schema))
+        self.rows_written += len(self._buf)
+        self._buf = []
+
+    def close(self):
+        self._flush()
+        self._writer.close()
+        os.replace(self.tmp_path, self.path)
+
+    def abort(self):
+        self._writer.close()
+        if os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+
+
+def _open(path: str) -> "pq.ParquetFile":
+    _require_arrow()
+    return pq.ParquetFile(path, memory_map=True)
+
+
+def count_rows(path: str = CHUNK_STORE_PATH) -> int:
+    return _open(path).metadata.num_rows
+
+
+def iter_batches(
+    path: str = CHUNK_STORE_PATH,
+    columns: Optional[Sequence[str]] = None,
+    batch_size: int = READ_BATCH_SIZE,
+) -> Iterator["pa.RecordBatch"]:
+    """
+    Stream record batches, reading only `columns` (all when None).
+    """
+    yield from _open(path).iter_batches(batch_size=batch_size, columns=list(columns) if columns else None)
+
+
+def iter_rows(path: str = CHUNK_STORE_PATH, columns: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+    for batch in iter_batches(path, columns):
+        yield from batch.to_pylist()
+
+
+def take_rows(path: str, positions: Sequence[int], columns: Optional[Sequence[str]] = None) -> Iterator[Dict]:
+    """
+    Rows at the given (sorted, global) positions; batches without a wanted row
+    are skipped without being converted to Python objects.
+    """
+    i, offset = 0, 0
+    for batch in iter_batches(path, columns):
+        end = offset + batch.num_rows
+        local: List[int] = []
+        while i < len(positions) and positions[i] < end:
+            local.append(positions[i] - offset)
+            i += 1
+        if local:
+            yield from batch.take(pa.array(local, type=pa.int64())).to_pylist()
+        if i >= len(positions):
+            return
+        offset = end
@@ -1,10 +1,28 @@
 # src/utils/chunking.py
-# Chunking utilities backed by LangChain's RecursiveCharacterTextSplitter.
-# Falls back to a simple word-based splitter if LangChain isn't available.
+# Chunking utilities. Chunk length is measured in the embedding model's tokens
+# (fast HF tokenizer, one batched call per document), so chunks fill the
+# embedder's window instead of being truncated or wastefully small.
+# Falls back to a word-count estimate if transformers isn't available; the
+# legacy LangChain character splitter is kept behind CHUNK_MODE=chars.
 
-from typing import List, Dict, Optional
+import os
+import re
+import importlib.util
+from functools import lru_cache
+from typing import List, Dict, Optional, Sequence, Tuple
 
-# ---- Try LangChain splitter; fallback if missing ----
+from src.models.registry import get_tokenizer, model_cfg, model_id
+
+# bump when chunk boundaries change for the same input; invalidates cached chunks
+CHUNKER_VERSION = 2
+
+CHUNK_MODE = os.getenv("CHUNK_MODE", "tokens")  # "tokens" | "chars" (legacy LangChain character count)
+WORDS_PER_TOKEN = 0.75  # word-count fallback: ~4 tokens per 3 English words (WordPiece)
+_WORD_RE = re.compile(r"\S+")
+
+_HAS_TRANSFORMERS = importlib.util.find_spec("transformers") is not None
+
+# ---- Try LangChain splitter (chars mode only) ----
 _USE_LANGCHAIN = True
 try:
     from langchain.text_splitter import RecursiveCharacterTextSplitter
@@ -12,56 +30,171 @@ except Exception:
     _USE_LANGCHAIN = False
 
 
-def _fallback_word_chunks(
-    text: str,
-    max_tokens: int,
-    overlap_ratio: float,
-) -> List[str]:
+def active_mode(mode: Optional[str] = None) -> str:
     """
-    Very simple word-based chunker: splits on whitespace with overlap.
-    Used only if LangChain is not installed.
+    Effective chunking mode: "tokens", "chars", or "words" (fallback for
+    either when its library is missing).
     """
-    words = (text or "").split()
-    if not words:
-        return []
+    mode = mode or CHUNK_MODE
+    if mode == "chars":
+        return "chars" if _USE_LANGCHAIN else "words"
+    return "tokens" if _HAS_TRANSFORMERS else "words"
 
-    overlap = max(0, int(max_tokens * overlap_ratio))
-    step = max(1, max_tokens - overlap)
 
-    out: List[str] = []
-    for start in range(0, len(words), step):
-        piece = words[start : start + max_tokens]
-        if not piece:
-            break
-        out.append(" ".join(piece))
-    return out
+def default_max_tokens(mode: Optional[str] = None) -> int:
+    """
+    Embedding window minus the [CLS]/[SEP] tokens (254 for a 256-token model).
+    """
+    if active_mode(mode) == "chars":
+        return 300
+    return int(model_cfg("embedding").get("max_length", 256)) - 2
+
 
+def chunker_signature(mode: Optional[str] = None) -> str:
+    """
+    Everything besides params that changes chunk boundaries; part of cache keys.
+    """
+    mode = active_mode(mode)
+    return f"v{CHUNKER_VERSION}:{mode}:{model_id('embedding') if mode == 'tokens' else ''}"
 
+
+@lru_cache(maxsize=16)
 def _build_splitter(
     max_tokens: int = 300,
     overlap_ratio: float = 0.15,
-    separators: Optional[List[str]] = None,
+    separators: Optional[Tuple[str, ...]] = None,
 ):
     """
-    Build a LangChain RecursiveCharacterTextSplitter with sensible defaults.
-    chunk_size ~= max_tokens (word-ish proxy), chunk_overlap = int(max_tokens * overlap_ratio).
+    Build (once per setting) a LangChain RecursiveCharacterTextSplitter.
+    chunk_size = max_tokens characters, chunk_overlap = int(max_tokens * overlap_ratio).
     """
     if separators is None:
         # Prefer bigger semantic boundaries first, then finer
-        separators = ["\n\n", "\n", ". ", " ", ""]
+        separators = ("\n\n", "\n", ". ", " ", "")
 
     chunk_overlap = max(0, int(max_tokens * overlap_ratio))
     return RecursiveCharacterTextSplitter(
         chunk_size=max_tokens,
         chunk_overlap=chunk_overlap,
-        separators=separators,
+        separators=list(separators),
         keep_separator=False,
     )
 
 
+def _offsets(paras: List[str], mode: str) -> List[Sequence[Tuple[int, int]]]:
+    """
+    Character span of every length unit (token or word) in each paragraph.
+    """
+    if mode == "tokens":
+        enc = get_tokenizer("embedding")(
+            paras, add_special_tokens=False, return_offsets_mapping=True, verbose=False,
+        )
+        return enc["offset_mapping"]
+    return [[m.span() for m in _WORD_RE.finditer(p)] for p in paras]
+
+
+def _windows(para: str, offsets: Sequence[Tuple[int, int]], limit: int, overlap: int) -> List[str]:
+    """
+    Split one over-long paragraph into windows of <= limit units with `overlap`
+    units shared between neighbours. Windows never start or end inside a word.
+    """
+    out: List[str] = []
+    n, start = len(offsets), 0
+    while start < n:
+        end = min(start + limit, n)
+        # back off while the next unit is glued to this one (sub-word piece);
+        # a single word longer than the window is cut where the window ends
+        cut = end
+        while cut < n and cut - start > 1 and offsets[cut][0] == offsets[cut - 1][1]:
+            cut -= 1
+        if cut < n and offsets[cut][0] != offsets[cut - 1][1]:
+            end = cut
+        out.append(para[offsets[start][0]:offsets[end - 1][1]])
+        if end >= n:
+            break
+        nxt = max(start + 1, end - overlap)
+        while nxt > start + 1 and offsets[nxt][0] == offsets[nxt - 1][1]:
+            nxt -= 1
+        start = nxt
+    return out
+
+
+def _pack(paras: List[str], offsets: List[Sequence[Tuple[int, int]]], limit: int, overlap: int) -> List[str]:
+    """
+    Greedily pack consecutive paragraphs into chunks of <= limit units; a
+    paragraph longer than `limit` is split into overlapping windows on its own.
+    """
+    out: List[str] = []
+    cur: List[str] = []
+    cur_len = 0
+    for para, offs in zip(paras, offsets):
+        n = len(offs)
+        if n == 0:
+            continue
+        if n > limit:
+            if cur:
+                out.append("\n".join(cur))
+                cur, cur_len = [], 0
+            out.extend(_windows(para, offs, limit, overlap))
+            continue
+        if cur and cur_len + n > limit:
+            out.append("\n".join(cur))
+            cur, cur_len = [], 0
+        cur.append(para)
+        cur_len += n
+    if cur:
+        out.append("\n".join(cur))
+    return out
+
+
+def _row(piece: str, section: Dict) -> Dict:
+    return {"text": piece.strip(), "page_no": section.get("page_no"), "section": section.get("section")}
+
+
+def chunk_sections(
+    sections: List[Dict],
+    max_tokens: Optional[int] = None,
+    overlap_ratio: float = 0.15,
+    mode: Optional[str] = None,
+) -> List[Dict]:
+    """
+    Chunk a whole document given as sections ({"paragraphs", "section", "page_no"}).
+    All paragraphs are tokenized in one batched call; chunks never cross sections.
+    Returns a list of dicts with fields: text, page_no, section.
+    """
+    mode = active_mode(mode)
+    max_tokens = max_tokens or default_max_tokens(mode)
+    out: List[Dict] = []
+
+    if mode == "chars":
+        # legacy: chunk within each paragraph, max_tokens counted in characters
+        splitter = _build_splitter(max_tokens=max_tokens, overlap_ratio=overlap_ratio)
+        for sec in sections:
+            for para in sec["paragraphs"]:
+                if not para or not para.strip():
+                    continue
+                out.extend(_row(p, sec) for p in splitter.split_text(para) if p and p.strip())
+        return out
+
+    limit = max_tokens if mode == "tokens" else max(1, int(max_tokens * WORDS_PER_TOKEN))
+    overlap = max(0, int(limit * overlap_ratio))
+    groups = [[p.strip() for p in sec["paragraphs"] if p and p.strip()] for sec in sections]
+    flat = [p for g in groups for p in g]
+    if not flat:
+        return out
+
+    offsets = _offsets(flat, mode)
+    i = 0
+    for sec, paras in zip(sections, groups):
+        offs = offsets[i:i + len(paras)]
+        i += len(paras)
+        out.extend(_row(p, sec) for p in _pack(paras, offs, limit, overlap) if p.strip())
+    return out
+
+
 def chunk_text(
     text: str,
-    max_tokens: int = 300,
+    max_tokens: Optional[int] = None,
     overlap_ratio: float = 0.15,
     section_path: Optional[str] = None,
     page_no: Optional[int] = None,
@@ -72,71 +205,24 @@ def chunk_text(
     """
     if not text:
         return []
-
-    if _USE_LANGCHAIN:
-        splitter = _build_splitter(max_tokens=max_tokens, overlap_ratio=overlap_ratio)
-        pieces = splitter.split_text(text)
-    else:
-        pieces = _fallback_word_chunks(text, max_tokens=max_tokens, overlap_ratio=overlap_ratio)
-
-    return [
-        {
-            "text": piece.strip(),
-            "page_no": page_no,
-            "section": section_path,
-        }
-        for piece in pieces
-        if piece and piece.strip()
-    ]
+    return heading_aware_chunks([text], max_tokens, overlap_ratio, section_path, page_no)
 
 
 def heading_aware_chunks(
     paragraphs: List[str],
-    max_tokens: int = 300,
+    max_tokens: Optional[int] = None,
     overlap_ratio: float = 0.15,
     section_path: Optional[str] = None,
     page_no: Optional[int] = None,
 ) -> List[Dict]:
     """
-    Split a list of paragraphs/sections, preserving their boundaries by chunking within each.
-    This mirrors your previous API so pdf/html parsers can call it unchanged.
+    Chunk a list of paragraphs from one section, breaking at paragraph
+    boundaries where possible. max_tokens defaults to the embedding window.
     """
-    out: List[Dict] = []
     if not paragraphs:
-        return out
-
-    if _USE_LANGCHAIN:
-        splitter = _build_splitter(max_tokens=max_tokens, overlap_ratio=overlap_ratio)
-        for para in paragraphs:
-            if not para or not para.strip():
-                continue
-            for piece in splitter.split_text(para):
-                if not piece or not piece.strip():
-                    continue
-                out.append(
-                    {
-                        "text": piece.strip(),
-                        "page_no": page_no,
-                        "section": section_path,
-                    }
-                )
-    else:
-        # Fallback: word-based per-paragraph chunks
-        for para in paragraphs:
-            if not para or not para.strip():
-                continue
-            for piece in _fallback_word_chunks(para, max_tokens=max_tokens, overlap_ratio=overlap_ratio):
-                if not piece or not piece.strip():
-                    continue
-                out.append(
-                    {
-                        "text": piece.strip(),
-                        "page_no": page_no,
-                        "section": section_path,
-                    }
-                )
-
-    return out
+        return []
+    section = {"paragraphs": paragraphs, "section": section_path, "page_no": page_no}
+    return chunk_sections([section], max_tokens=max_tokens, overlap_ratio=overlap_ratio)
 
 
 # Optional: quick self-test when run directly
@@ -0,0 +1,42 @@
+# src/utils/concurrency.py
+# Executor used by async graph nodes to keep CPU-bound model calls off the event loop.
+
+import os
+import asyncio
+import functools
+from concurrent.futures import ThreadPoolExecutor
+
+MODEL_WORKERS = int(os.getenv("MODEL_WORKERS", str(min(8, os.cpu_count() or 1))))
+
+model_executor = ThreadPoolExecutor(max_workers=MODEL_WORKERS, thread_name_prefix="model")
+
+
+async def run_blocking(fn, *args, **kwargs):
+    loop = asyncio.get_running_loop()
+    return await loop.run_in_executor(model_executor, functools.partial(fn, *args, **kwargs))
+
+
+async def iterate_blocking(iter_fn, *args, **kwargs):
+    """
+    Async iterator over a blocking generator (e.g. token streaming): the
+    generator is drained on the model executor and items are handed to the
+    event loop as they are produced.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    done = object()
+
+    def produce():
+        try:
+            for item in iter_fn(*args, **kwargs):
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        finally:
+            loop.call_soon_threadsafe(queue.put_nowait, done)
+
+    fut = loop.run_in_executor(model_executor, produce)
+    while True:
+        item = await queue.get()
+        if item is done:
+            break
+        yield item
+    await fut  # re-raises the generator's exception, if any
@@ -9,6 +9,7 @@ class CrawlerConfig:
     request_timeout: int
     max_depth: int
     max_pages: int
+    workers_per_host: int = 4
 
 def load_config(path: str) -> Dict[str, Any]:
     with open(path, "r", encoding="utf-8") as f:
@@ -22,4 +23,5 @@ def get_crawler_cfg(cfg: Dict[str, Any]) -> CrawlerConfig:
         request_timeout=int(c.get("request_timeout", 20)),
         max_depth=int(c.get("max_depth", 3)),
         max_pages=int(c.get("max_pages", 250)),
+        workers_per_host=int(c.get("workers_per_host", 4)),
     )
@@ -0,0 +1,181 @@
+# src/utils/embedding_cache.py
+# Persistent embedding cache: memory-mapped float32 matrix + sha256 -> row index.
+# One directory per embedding model, so keys are effectively (model_id, sha256(text)).
+# Query traffic uses the bounded in-memory LRUEmbeddingCache instead: the disk
+# cache belongs to the indexer (one writer process per directory).
+
+import os
+import re
+import json
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import Callable, Dict, List, Optional, Sequence
+
+import numpy as np
+
+EMB_CACHE_DIR = os.getenv("EMB_CACHE_DIR", "data/index/emb_cache")
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+def _model_slug(model_id: str) -> str:
+    # "sentence-transformers/all-MiniLM-L6-v2" and "all-MiniLM-L6-v2" are the same model
+    if model_id.startswith("sentence-transformers/"):
+        model_id = model_id.split("/", 1)[1]
+    return re.sub(r"[^A-Za-z0-9._-]+", "_", model_id)
+
+
+class EmbeddingCache:
+    """
+    Append-only on-disk cache.
+    - vectors.f32: raw float32 rows, read through np.memmap
+    - index.jsonl: {"h": <sha256>, "row": <int>} per cached vector
+    - meta.json:   model id + dimension (checked on open)
+    Vectors are stored exactly as returned by the encode function, so callers
+    must use the same normalization for every call on one cache.
+    Safe across threads; use one writer process per cache directory.
+    """
+
+    def __init__(self, model_id: str, root: str = EMB_CACHE_DIR):
+        self.model_id = model_id
+        self.dir = os.path.join(root, _model_slug(model_id))
+        self.vec_path = os.path.join(self.dir, "vectors.f32")
+        self.index_path = os.path.join(self.dir, "index.jsonl")
+        self.meta_path = os.path.join(self.dir, "meta.json")
+        self.dim: Optional[int] = None
+        self._rows: Dict[str, int] = {}
+        self._mmap: Optional[np.memmap] = None
+        self._lock = threading.Lock()
+        self._load()
+
+    # ---------- Disk state ----------
+    def _load(self):
+        if os.path.exists(self.meta_path):
+            with open(self.meta_path, "r", encoding="utf-8") as f:
+                self.dim = int(json.load(f)["dim"])
+        if self.dim is None or not os.path.exists(self.index_path):
+            return
+        # rows past the end of the vector file belong to an interrupted write
+        # (a partial trailing vector row is cut off by the next put_many)
+        n_vecs = os.path.getsize(self.vec_path) // (4 * self.dim) if os.path.exists(self.vec_path) else 0
+        with open(self.index_path, "r", encoding="utf-8") as f:
+            for line in f:
+                try:
+                    rec = json.loads(line)
+                except json.JSONDecodeError:
+                    continue
+                if rec.get("row", n_vecs) < n_vecs:
+                    self._rows[rec["h"]] = rec["row"]
+
+    def _init_dim(self, dim: int):
+        os.makedirs(self.dir, exist_ok=True)
+        with open(self.meta_path, "w", encoding="utf-8") as f:
+            json.dump({"model_id": self.model_id, "dim": dim}, f)
+        self.dim = dim
+
+    def _matrix(self) -> np.memmap:
+        n = os.path.getsize(self.vec_path) // (4 * self.dim)
+        if self._mmap is None or self._mmap.shape[0] < n:
+            self._mmap = np.memmap(self.vec_path, dtype=np.float32, mode="r", shape=(n, self.dim))
+        return self._mmap
+
+    # ---------- Public API ----------
+    def __len__(self) -> int:
+        return len(self._rows)
+
+    def get_many(self, hashes: Sequence[str]) -> Dict[str, np.ndarray]:
+        with self._lock:
+            hits = {h: self._rows[h] for h in hashes if h in self._rows}
+            if not hits:
+                return {}
+            mat = self._matrix()
+            return {h: np.array(mat[row]) for h, row in hits.items()}
+
+    def put_many(self, hashes: Sequence[str], vecs: np.ndarray):
+        vecs = np.ascontiguousarray(vecs, dtype=np.float32)
+        if not len(hashes):
+            return
+        with self._lock:
+            if self.dim is None:
+                self._init_dim(vecs.shape[1])
+            elif vecs.shape[1] != self.dim:
+                raise ValueError(f"Embedding dim {vecs.shape[1]} != cached dim {self.dim} for {self.model_id}")
+            start = os.path.getsize(self.vec_path) // (4 * self.dim) if os.path.exists(self.vec_path) else 0
+            # drop a partial trailing row left by an interrupted write, so new
+            # rows start exactly at `start`
+            with open(self.vec_path, "r+b" if os.path.exists(self.vec_path) else "wb") as f:
+                f.truncate(start * 4 * self.dim)
+                f.seek(0, os.SEEK_END)
+                f.write(vecs.tobytes())
+            with open(self.index_path, "a", encoding="utf-8") as f:
+                for i, h in enumerate(hashes):
+                    f.write(json.dumps({"h": h, "row": start + i}) + "\n")
+                    self._rows[h] = start + i
+
+    def encode(
+        self,
+        texts: List[str],
+        encode_fn: Callable[[List[str]], np.ndarray],
+        hashes: Optional[List[str]] = None,
+    ) -> np.ndarray:
+        """
+        Return embeddings for `texts`, calling `encode_fn` only for cache misses.
+        `hashes` may be passed when sha256(text) is already known.
+        """
+        hashes = hashes or [text_hash(t) for t in texts]
+        found = self.get_many(hashes)
+
+        miss_idx: List[int] = []
+        seen = set()
+        for i, h in enumerate(hashes):
+            if h not in found and h not in seen:
+                seen.add(h)
+                miss_idx.append(i)
+        if miss_idx:
+            new_vecs = np.asarray(encode_fn([texts[i] for i in miss_idx]), dtype=np.float32)
+            new_hashes = [hashes[i] for i in miss_idx]
+            self.put_many(new_hashes, new_vecs)
+            found.update(zip(new_hashes, new_vecs))
+
+        return np.stack([found[h] for h in hashes]) if hashes else np.zeros((0, self.dim or 0), np.float32)
+
+
+class LRUEmbeddingCache:
+    """
+    Bounded in-process text -> vector cache with the same encode() contract
+    as EmbeddingCache. Nothing is persisted, so any number of processes
+    (API workers, indexer) can run side by side.
+    """
+
+    def __init__(self, maxsize: int):
+        self.maxsize = maxsize
+        self._data: "OrderedDict[str, np.ndarray]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+    def encode(self, texts: List[str], encode_fn: Callable[[List[str]], np.ndarray]) -> np.ndarray:
+        hashes = [text_hash(t) for t in texts]
+        with self._lock:
+            found = {h: self._data[h] for h in hashes if h in self._data}
+            for h in found:
+                self._data.move_to_end(h)
+        miss_idx: List[int] = []
+        seen = set()
+        for i, h in enumerate(hashes):
+            if h not in found and h not in seen:
+                seen.add(h)
+                miss_idx.append(i)
+        if miss_idx:
+            new_vecs = np.asarray(encode_fn([texts[i] for i in miss_idx]), dtype=np.float32)
+            new = dict(zip((hashes[i] for i in miss_idx), new_vecs))
+            found.update(new)
+            with self._lock:
+                self._data.update(new)
+                while len(self._data) > self.maxsize:
+                    self._data.popitem(last=False)
+        return np.stack([found[h] for h in hashes]) if hashes else np.zeros((0, 0), np.float32)
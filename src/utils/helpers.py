@@ -7,11 +7,12 @@ import json
 import time
 import hashlib
 import pathlib
+import threading
 import urllib.parse as up
 from typing import Optional, Dict, List, Any
 
 import requests
-from bs4 import BeautifulSoup
+from requests.adapters import HTTPAdapter
 from urllib.robotparser import RobotFileParser
 
 # ---------- Paths (project-standard) ----------
@@ -24,15 +25,17 @@ CURRENT_CFG: Dict[str, Any] = {
     "USER_AGENT": "AgenticRAG-DevScraper/0.1 (+local dev)",
     "THROTTLE_SECONDS": 0.75,
     "REQUEST_TIMEOUT": 20,
+    "POOL_SIZE": 8,
 }
 
-def apply_runtime_config(user_agent: str, throttle: float, timeout: int):
+def apply_runtime_config(user_agent: str, throttle: float, timeout: int, pool_size: Optional[int] = None):
     """
     Called by html_crawler/pdf_collector after loading YAML config.
     """
     CURRENT_CFG["USER_AGENT"] = user_agent or CURRENT_CFG["USER_AGENT"]
     CURRENT_CFG["THROTTLE_SECONDS"] = float(throttle) if throttle is not None else CURRENT_CFG["THROTTLE_SECONDS"]
     CURRENT_CFG["REQUEST_TIMEOUT"] = int(timeout) if timeout is not None else CURRENT_CFG["REQUEST_TIMEOUT"]
+    CURRENT_CFG["POOL_SIZE"] = int(pool_size) if pool_size is not None else CURRENT_CFG["POOL_SIZE"]
 
 def get_headers() -> Dict[str, str]:
     return {"User-Agent": CURRENT_CFG["USER_AGENT"]}
@@ -40,6 +43,69 @@ def get_headers() -> Dict[str, str]:
 def polite_wait():
     time.sleep(float(CURRENT_CFG["THROTTLE_SECONDS"]))
 
+# ---------- Per-host politeness + connection pooling ----------
+class TokenBucket:
+    """
+    Thread-safe token bucket: `rate` requests/sec sustained, `burst` at once.
+    """
+
+    def __init__(self, rate: float, burst: int = 1):
+        self.rate = rate
+        self.capacity = float(burst)
+        self.tokens = float(burst)
+        self.updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1.0:
+                    self.tokens -= 1.0
+                    return
+                wait = (1.0 - self.tokens) / self.rate
+            time.sleep(wait)
+
+_HOST_LOCK = threading.Lock()
+_BUCKETS: Dict[str, TokenBucket] = {}
+_SESSIONS: Dict[str, requests.Session] = {}
+
+def host_bucket(url: str) -> TokenBucket:
+    """
+    One bucket per host, refilling at 1 / THROTTLE_SECONDS requests per second.
+    """
+    host = up.urlparse(url).netloc
+    with _HOST_LOCK:
+        if host not in _BUCKETS:
+            throttle = float(CURRENT_CFG["THROTTLE_SECONDS"])
+            _BUCKETS[host] = TokenBucket(rate=1.0 / throttle if throttle > 0 else float("inf"))
+        return _BUCKETS[host]
+
+def host_session(url: str) -> requests.Session:
+    """
+    One keep-alive session per host, sized for the crawler's worker count.
+    """
+    host = up.urlparse(url).netloc
+    with _HOST_LOCK:
+        if host not in _SESSIONS:
+            sess = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=int(CURRENT_CFG["POOL_SIZE"]))
+            sess.mount("http://", adapter)
+            sess.mount("https://", adapter)
+            sess.headers.update(get_headers())
+            _SESSIONS[host] = sess
+        return _SESSIONS[host]
+
+def host_wait(url: str):
+    """
+    Per-host replacement for polite_wait(): blocks only callers hitting the same host.
+    """
+    throttle = float(CURRENT_CFG["THROTTLE_SECONDS"])
+    if throttle > 0:
+        host_bucket(url).acquire()
+
 # ---------- Filesystem ----------
 def ensure_dirs():
     for d in (RAW_HTML_DIR, RAW_PDF_DIR, RAW_META_DIR):
@@ -55,11 +121,38 @@ def write_text(path: str, text: str):
     with open(path, "w", encoding="utf-8") as f:
         f.write(text)
 
+def write_text_atomic(path: str, text: str):
+    """
+    Write via a temp file + rename so readers never see a half-written file.
+    """
+    pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True)
+    tmp = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        f.write(text)
+    os.replace(tmp, path)
+
+def read_jsonl(path: str):
+    """
+    Yield records from a JSONL file, skipping malformed lines. Missing file -> nothing.
+    """
+    if not os.path.exists(path):
+        return
+    with open(path, "r", encoding="utf-8") as f:
+        for line in f:
+            try:
+                yield json.loads(line)
+            except json.JSONDecodeError:
+                continue
+
+_APPEND_LOCK = threading.Lock()
+
 def append_jsonl(path: str, record: Dict):
     pathlib.Path(os.path.dirname(path)).mkdir(parents=True, exist_ok=True
     )
-    with open(path, "a", encoding="utf-8") as f:
-        f.write(json.dumps(record, ensure_ascii=False) + "\n")
+    line = json.dumps(record, ensure_ascii=False) + "\n"
+    with _APPEND_LOCK:  # crawler workers share per-host logs
+        with open(path, "a", encoding="utf-8") as f:
+            f.write(line)
 
 # ---------- Hash / Filenames ----------
 def sha256_bytes(b: bytes) -> str:
@@ -104,28 +197,27 @@ def get_robots_parser(base: str) -> RobotFileParser:
         rp.parse([])
     return rp
 
-def fetch(url: str) -> Optional[requests.Response]:
+def fetch(url: str, headers: Optional[Dict[str, str]] = None, stream: bool = False) -> Optional[requests.Response]:
+    """
+    GET through the host's pooled session. With stream=True the body is not
+    read yet; the caller must consume or close the response.
+    """
     try:
-        return requests.get(
+        return host_session(url).get(
             url,
-            headers=get_headers(),
+            headers={**get_headers(), **(headers or {})},
             timeout=int(CURRENT_CFG["REQUEST_TIMEOUT"]),
             allow_redirects=True,
+            stream=stream,
         )
     except requests.RequestException:
         return None
 
 # ---------- HTML parsing ----------
-def extract_links(html: str, base_url: str) -> List[str]:
+def extract_links(html: str, base_url: str, sha256: Optional[str] = None) -> List[str]:
     """
     Extract absolute links from HTML, resolving relative links against base_url.
+    Pass the page's sha256 to share the parse with later stages (see html_parse).
     """
-    soup = BeautifulSoup(html, "html.parser")
-    hrefs = set()
-    for tag in soup.find_all(["a", "area"]):
-        href = tag.get("href")
-        if not href:
-            continue
-        abs_url = up.urljoin(base_url, href)
-        hrefs.add(normalize_url(abs_url))
-    return list(hrefs)
+    from src.utils.html_parse import parse_cached
+    return parse_cached(html, sha256).links(base_url)
@@ -0,0 +1,163 @@
+# src/utils/html_parse.py
+# Shared HTML parse layer: one parse per page yields links, title, headings
+# and main text. Uses lxml when installed, BeautifulSoup's html.parser otherwise.
+# Results can be cached by the page's sha256 so the crawler, the PDF link
+# collector and the chunker never reparse the same HTML.
+
+import os
+import json
+import threading
+import urllib.parse as up
+from collections import OrderedDict
+from dataclasses import dataclass, asdict, field
+from typing import List, Optional
+
+try:
+    import lxml.html
+    from lxml import etree
+    _HAS_LXML = True
+except ImportError:
+    _HAS_LXML = False
+
+PARSER_VERSION = 2  # bump when extraction output changes; invalidates cached parses
+PARSE_CACHE_DIR = os.getenv("PARSE_CACHE_DIR", "data/processed/parsed")
+PARSE_MEMORY_SIZE = 256
+
+_DROP_TAGS = ["script", "style", "noscript"]
+_LAYOUT_TAGS = ["nav", "header", "footer", "form", "aside"]
+
+
+@dataclass
+class ParsedPage:
+    title: str = ""
+    headings: List[str] = field(default_factory=list)  # h1-h3, document order
+    main_text: str = ""                                 # visible text, one block per line
+    hrefs: List[str] = field(default_factory=list)      # raw a/area hrefs (unresolved)
+    version: int = PARSER_VERSION
+
+    def links(self, base_url: str) -> List[str]:
+        """
+        Absolute, normalized, de-duplicated links resolved against base_url.
+        """
+        from src.utils.helpers import normalize_url
+        return list({normalize_url(up.urljoin(base_url, h)) for h in self.hrefs})
+
+    @property
+    def section_path(self) -> Optional[str]:
+        return " > ".join(self.headings[:3]) if self.headings else None
+
+
+def _clean_lines(text: str) -> str:
+    lines = [ln.strip() for ln in text.splitlines()]
+    return "\n".join(ln for ln in lines if ln)
+
+
+def _parse_lxml(html: str) -> ParsedPage:
+    try:
+        doc = lxml.html.document_fromstring(html)
+    except (etree.ParserError, ValueError):
+        # e.g. str input with an <?xml ... encoding=...?> declaration: lxml
+        # refuses it outright, html.parser does not
+        return _parse_bs4(html)
+
+    title_el = doc.find(".//title")
+    title = (title_el.text or "").strip() if title_el is not None else ""
+    heads = [
+        " ".join(t.strip() for t in h.itertext() if t.strip())
+        for h in doc.xpath("//h1|//h2|//h3")
+    ]
+    hrefs = [h for h in doc.xpath("//a/@href|//area/@href") if h]
+
+    # same removals as the old BeautifulSoup extractor; tails are sibling text, keep them
+    etree.strip_elements(doc, etree.Comment, *_DROP_TAGS, *_LAYOUT_TAGS, with_tail=False)
+    main_text = _clean_lines("\n".join(doc.itertext()))
+    return ParsedPage(title=title, headings=heads, main_text=main_text, hrefs=hrefs)
+
+
+def _parse_bs4(html: str) -> ParsedPage:
+    from bs4 import BeautifulSoup
+
+    soup = BeautifulSoup(html, "html.parser")
+    title = (soup.title.string or "").strip() if soup.title else ""
+    heads = [h.get_text(" ", strip=True) for h in soup.find_all(["h1", "h2", "h3"])]
+    hrefs = [t.get("href") for t in soup.find_all(["a", "area"]) if t.get("href")]
+
+    for tag in soup(_DROP_TAGS + _LAYOUT_TAGS):
+        tag.decompose()
+    main_text = _clean_lines(soup.get_text(separator="\n"))
+    return ParsedPage(title=title, headings=heads, main_text=main_text, hrefs=hrefs)
+
+
+def parse_html(html: str) -> ParsedPage:
+    return _parse_lxml(html) if _HAS_LXML else _parse_bs4(html)
+
+
+# ---------- sha256-keyed cache (memory LRU + disk) ----------
+_memory: "OrderedDict[str, ParsedPage]" = OrderedDict()
+_memory_lock = threading.Lock()
+
+
+def _cache_path(sha256: str) -> str:
+    return os.path.join(PARSE_CACHE_DIR, sha256[:2], f"{sha256}.json")
+
+
+def _remember(sha256: str, page: ParsedPage):
+    with _memory_lock:
+        _memory[sha256] = page
+        _memory.move_to_end(sha256)
+        while len(_memory) > PARSE_MEMORY_SIZE:
+            _memory.popitem(last=False)
+
+
+def load_parsed(sha256: str) -> Optional[ParsedPage]:
+    with _memory_lock:
+        page = _memory.get(sha256)
+    if page is not None:
+        return page
+    path = _cache_path(sha256)
+    if not os.path.exists(path):
+        return None
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            page = ParsedPage(**json.load(f))
+    except (json.JSONDecodeError, TypeError):
+        return None
+    if page.version != PARSER_VERSION:
+        return None
+    _remember(sha256, page)
+    return page
+
+
+def parse_cached(html: str, sha256: Optional[str]) -> ParsedPage:
+    """
+    Parse `html` unless a parse for its sha256 is cached; store new parses.
+    """
+    if not sha256:
+        return parse_html(html)
+    page = load_parsed(sha256)
+    if page is not None:
+        return page
+    page = parse_html(html)
+    path = _cache_path(sha256)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp = f"{path}.tmp.{os.getpid()}.{threading.get_ident()}"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(asdict(page), f, ensure_ascii=False)
+    os.replace(tmp, path)
+    _remember(sha256, page)
+    return page
+
+
+def parse_file_cached(path: str, sha256: Optional[str]) -> Optional[ParsedPage]:
+    """
+    Cached parse for a saved HTML file; reads the file only on a cache miss.
+    """
+    page = load_parsed(sha256) if sha256 else None
+    if page is not None:
+        return page
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            html = f.read()
+    except FileNotFoundError:
+        return None
+    return parse_cached(html, sha256)
@@ -1,5 +1,56 @@
+import os
+import asyncio
+import threading
 import weaviate
 
-WEAVIATE_URL = "http://localhost:8080"
+WEAVIATE_URL = os.getenv("WEAVIATE_URL", "http://localhost:8080")
 
-client = weaviate.connect_to_local(skip_init_checks=True)
+# Connections are opened on first use so importing the agents never needs a
+# running Weaviate; tests and local runs can inject stubs with set_client().
+_client = None
+_async_client = None
+_lock = threading.Lock()
+_async_lock = asyncio.Lock()  # concurrent first requests must not each connect a client
+
+
+def get_client():
+    global _client
+    with _lock:
+        if _client is None:
+            _client = weaviate.connect_to_local(skip_init_checks=True)
+        return _client
+
+
+async def get_async_client():
+    global _async_client
+    if _async_client is None:
+        async with _async_lock:
+            if _async_client is None:
+                client = weaviate.use_async_with_local(skip_init_checks=True)
+                await client.connect()
+                _async_client = client
+    return _async_client
+
+
+def set_client(client):
+    global _client
+    _client = client
+
+
+def set_async_client(client):
+    global _async_client
+    _async_client = client
+
+
+def close_client():
+    global _client
+    if _client is not None:
+        _client.close()
+        _client = None
+
+
+async def close_async_client():
+    global _async_client
+    if _async_client is not None:
+        await _async_client.close()
+        _async_client = None
@@ -0,0 +1,163 @@
+# tests/conftest.py
+# End-to-end graph tests with every model and Weaviate stubbed out: a
+# bag-of-words embedder, a canned generator and an in-memory collection.
+# Run from the repo root:  python -m pytest -q
+
+import os
+import re
+import sys
+import zlib
+from types import SimpleNamespace
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)                      # pipeline modules: src.scraping, src.utils
+sys.path.insert(0, os.path.join(ROOT, "src"))  # agent layer: agents, utils, models
+os.chdir(ROOT)  # configs/*.yaml are read relative to the repo root
+
+DIM = 64
+ANSWER = "Stub answer [{doc_id}]"
+
+DOCS = [
+    {"chunk_id": "wells_routing_c0", "domain": "wells", "title": "Routing numbers",
+     "text": "Your routing number for checking account transfers is printed on your checks."},
+    {"chunk_id": "wells_zelle_c0", "domain": "wells", "title": "Zelle",
+     "text": "Set up Zelle in the mobile app to send money from your checking account."},
+    {"chunk_id": "lucid_range_c0", "domain": "lucid", "title": "Lucid Air range",
+     "text": "The Lucid Air range depends on trim, wheels and battery temperature."},
+    {"chunk_id": "lucid_charging_c0", "domain": "lucid", "title": "Charging",
+     "text": "Charge the Lucid Air at home with the Wall Charger or at DC fast chargers."},
+]
+
+
+def bag_of_words(texts):
+    import numpy as np
+
+    vecs = np.zeros((len(texts), DIM), dtype=np.float32)
+    for i, text in enumerate(texts):
+        for word in re.findall(r"\w+", text.lower()):
+            vecs[i, zlib.crc32(word.encode()) % DIM] += 1.0
+    return vecs / np.maximum(np.linalg.norm(vecs, axis=1, keepdims=True), 1e-12)
+
+
+class StubCollection:
+    """
+    Answers near_vector / bm25 / hybrid with every doc (matching the domain
+    filter, if any), scored by word overlap. `is_async` returns coroutines
+    like the v4 async client.
+    """
+
+    def __init__(self, calls, is_async=False):
+        self.calls = calls
+        self.is_async = is_async
+        self.query = self
+
+    def with_tenant(self, tenant):
+        return self
+
+    def _respond(self, query, filters):
+        self.calls.append({"query": query, "filters": filters})
+        domain = getattr(filters, "value", None)
+        words = set(re.findall(r"\w+", (query or "").lower()))
+        objects = [
+            SimpleNamespace(
+                properties=dict(d),
+                metadata=SimpleNamespace(score=len(words & set(re.findall(r"\w+", d["text"].lower()))), distance=None),
+            )
+            for d in DOCS if domain is None or d["domain"] == domain
+        ]
+        return SimpleNamespace(objects=objects)
+
+    def hybrid(self, query=None, filters=None, **kwargs):
+        return self._wrap(self._respond(query, filters))
+
+    bm25 = hybrid
+
+    def near_vector(self, near_vector=None, filters=None, **kwargs):
+        return self._wrap(self._respond(None, filters))
+
+    def _wrap(self, response):
+        return _maybe_async(response, self.is_async)
+
+
+class StubClient:
+    def __init__(self, calls, is_async=False):
+        self.is_async = is_async
+        self.collections = SimpleNamespace(get=lambda name: StubCollection(calls, is_async))
+
+    def close(self):
+        return _maybe_async(None, self.is_async)
+
+
+def _maybe_async(value, is_async):
+    if not is_async:
+        return value
+
+    async def done():
+        return value
+    return done()
+
+
+@pytest.fixture
+def stubbed(monkeypatch, tmp_path):
+    """
+    Patches models, caches and Weaviate; returns a recorder with the
+    embed / generate / search calls made while the test runs.
+    """
+    pytest.importorskip("numpy")
+    pytest.importorskip("langgraph")
+    pytest.importorskip("weaviate")
+
+    import agents.intent_router as intent_router
+    import agents.retrieval as retrieval
+    import agents.semantic_cache as semantic_cache
+    import agents.synthesizer as synthesizer
+    import utils.weaviate_client as weaviate_client
+
+    rec = SimpleNamespace(embedded=[], generated=[], regenerated=[], searches=[])
+
+    def embed_queries(texts):
+        rec.embedded.append(list(texts))
+        return bag_of_words(texts)
+
+    for mod in (retrieval, semantic_cache, intent_router):
+        monkeypatch.setattr(mod, "embed_queries", embed_queries)
+
+    def generate(prompt):
+        rec.generated.append(prompt)
+        doc_id = re.search(r"\[([^\]\s]+)\]", prompt.split("Context:", 1)[1])
+        return ANSWER.format(doc_id=doc_id.group(1) if doc_id else "none")
+
+    def regenerate(prompt):
+        rec.regenerated.append(prompt)
+        return generate(prompt)
+
+    def stream_generate(prompt, max_new_tokens=None):
+        for piece in re.findall(r"\S+\s*", generate(prompt)):
+            yield piece
+
+    def token_spans(texts):
+        return [[m.span() for m in re.finditer(r"\S+", t)] for t in texts]
+
+    monkeypatch.setattr(synthesizer, "_generate", generate)
+    monkeypatch.setattr(synthesizer, "regenerate", regenerate)
+    monkeypatch.setattr(synthesizer, "stream_generate", stream_generate)
+    monkeypatch.setattr(synthesizer, "_token_spans", token_spans)
+    monkeypatch.setattr(retrieval, "rerank", lambda cands, k: (
+        [dict(c, score=c["retrieval_score"]) for c in sorted(cands, key=lambda c: -c["retrieval_score"])[:k]], {}
+    ))
+
+    monkeypatch.setattr(semantic_cache, "semantic_cache", semantic_cache.SemanticCache(
+        capacity=8, ttl=3600, threshold=0.92, reindex_log=str(tmp_path / "reindexed_chunks.jsonl"),
+    ))
+    monkeypatch.setattr(intent_router, "INTENT_CENTROIDS", str(tmp_path / "intent_centroids.npz"))
+    monkeypatch.setattr(intent_router, "_centroids", None)
+    intent_router.load_centroids()
+    rec.embedded.clear()  # centroid examples are not query traffic
+
+    weaviate_client.set_client(StubClient(rec.searches))
+    weaviate_client.set_async_client(StubClient(rec.searches, is_async=True))
+    yield rec
+    weaviate_client.set_client(None)
+    weaviate_client.set_async_client(None)
@@ -0,0 +1,59 @@
+import asyncio
+import json
+
+import pytest
+
+QUERY = "What is the routing number for my checking account?"
+
+
+@pytest.fixture
+def client(stubbed):
+    pytest.importorskip("httpx")
+    from fastapi.testclient import TestClient
+    from api.app import create_app
+
+    with TestClient(create_app(preload_models=False)) as c:
+        yield c
+
+
+def test_ask_returns_the_answer(client):
+    res = client.post("/ask", json={"query": QUERY})
+
+    assert res.status_code == 200
+    body = res.json()
+    assert body["answer"] == "Stub answer [wells_routing_c0]"
+    assert body["sources"][0]["doc_id"] == "wells_routing_c0"
+    assert body["cache_hit"] is False
+
+
+def test_ask_streams_ndjson(client):
+    res = client.post("/ask", json={"query": QUERY, "stream": True})
+
+    lines = [json.loads(line) for line in res.text.splitlines()]
+    tokens = [line["token"] for line in lines[:-1]]
+    assert len(tokens) > 1
+    assert lines[-1]["done"]["answer"] == "".join(tokens)
+
+
+def test_async_client_connects_once(stubbed, monkeypatch):
+    import utils.weaviate_client as weaviate_client
+
+    created = []
+
+    class Client:
+        async def connect(self):
+            await asyncio.sleep(0.01)
+
+    def use_async_with_local(**kwargs):
+        created.append(Client())
+        return created[-1]
+
+    monkeypatch.setattr(weaviate_client.weaviate, "use_async_with_local", use_async_with_local)
+    weaviate_client.set_async_client(None)
+
+    async def first_requests():
+        return await asyncio.gather(*(weaviate_client.get_async_client() for _ in range(8)))
+
+    clients = asyncio.run(first_requests())
+    assert len(created) == 1
+    assert all(c is created[0] for c in clients)
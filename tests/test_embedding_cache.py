@@ -0,0 +1,36 @@
+import pytest
+
+np = pytest.importorskip("numpy")
+
+
+def test_put_after_partial_row_stays_aligned(tmp_path):
+    from utils.embedding_cache import EmbeddingCache
+
+    cache = EmbeddingCache("test-model", root=str(tmp_path))
+    cache.put_many(["a"], np.full((1, 4), 1.0))
+    with open(cache.vec_path, "ab") as f:  # interrupted write: half a row
+        f.write(np.full(2, 9.0, dtype=np.float32).tobytes())
+
+    cache = EmbeddingCache("test-model", root=str(tmp_path))
+    cache.put_many(["b"], np.full((1, 4), 5.0))
+
+    got = EmbeddingCache("test-model", root=str(tmp_path)).get_many(["a", "b"])
+    assert got["a"].tolist() == [1.0] * 4
+    assert got["b"].tolist() == [5.0] * 4
+
+
+def test_encode_only_calls_for_misses(tmp_path):
+    from utils.embedding_cache import EmbeddingCache
+
+    calls = []
+
+    def encode(texts):
+        calls.append(list(texts))
+        return np.array([[float(len(t))] * 4 for t in texts])
+
+    cache = EmbeddingCache("test-model", root=str(tmp_path))
+    cache.encode(["x", "yy"], encode)
+    out = EmbeddingCache("test-model", root=str(tmp_path)).encode(["yy", "zzz", "zzz"], encode)
+
+    assert calls == [["x", "yy"], ["zzz"]]
+    assert out[:, 0].tolist() == [2.0, 3.0, 3.0]
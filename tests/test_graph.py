@@ -0,0 +1,164 @@
+import asyncio
+
+import pytest
+
+QUERY = "What is the routing number for my checking account?"
+
+
+@pytest.fixture
+def graph(stubbed):
+    from main import build_graph
+    return build_graph()
+
+
+def test_cache_miss_runs_the_pipeline(graph, stubbed):
+    result = graph.invoke({"query": QUERY})
+
+    assert result["query"] == QUERY
+    assert result["cache_hit"] is False
+    assert result["final_answer"] == "Stub answer [wells_routing_c0]"
+    assert result["error"] is None
+    assert result["retrieved_docs"][0]["doc_id"] == "wells_routing_c0"
+    assert len(stubbed.generated) == 1
+
+
+def test_answer_is_stored_and_served_from_the_semantic_cache(graph, stubbed):
+    import agents.semantic_cache as semantic_cache
+
+    first = graph.invoke({"query": QUERY})
+    assert len(semantic_cache.semantic_cache) == 1
+
+    second = graph.invoke({"query": QUERY})
+    assert second["cache_hit"] is True
+    assert second["final_answer"] == first["final_answer"]
+    assert len(stubbed.generated) == 1  # no second retrieval / generation
+
+
+def test_async_graph_matches_sync(stubbed):
+    from main import build_graph
+
+    result = asyncio.run(build_graph(async_mode=True).ainvoke({"query": QUERY}))
+
+    assert result["query"] == QUERY
+    assert result["final_answer"] == "Stub answer [wells_routing_c0]"
+
+
+def test_router_domain_filters_retrieval(graph, stubbed):
+    result = graph.invoke({"query": QUERY})
+
+    assert result["domain"] == "wells"
+    assert stubbed.searches and all(s["filters"] is not None for s in stubbed.searches)
+    assert {d["domain"] for d in result["retrieved_docs"]} == {"wells"}
+
+
+def test_ambiguous_query_searches_every_domain(graph, stubbed):
+    result = graph.invoke({"query": "Why was my card declined?"})
+
+    assert result["domain"] is None
+    assert stubbed.searches and all(s["filters"] is None for s in stubbed.searches)
+
+
+@pytest.mark.parametrize("query, domain", [
+    ("What is the range of the Lucid Air?", "lucid"),
+    ("How do I set up Zelle?", "wells"),
+    ("What is the routing number for my checking account?", "wells"),
+    ("Why was my card declined?", None),        # one generic cue
+    ("Is my car loan due?", None),              # one cue per domain
+    ("the air in here is cold", None),
+])
+def test_infer_domain_needs_a_clear_lead(query, domain):
+    pytest.importorskip("numpy")
+    from agents.intent_router import infer_domain
+    assert infer_domain(query) == domain
+
+
+def test_query_is_encoded_once(graph, stubbed):
+    graph.invoke({"query": QUERY})
+
+    # semantic cache embeds the query; the router and retrieval reuse that vector
+    assert stubbed.embedded == [[QUERY]]
+
+
+def test_only_extra_sub_queries_are_encoded(graph, stubbed):
+    query = "Compare the Air Pure with the Air Touring"
+    result = graph.invoke({"query": query})
+
+    assert result["sub_queries"][0] == query and len(result["sub_queries"]) == 3
+    assert stubbed.embedded == [[query], result["sub_queries"][1:]]
+
+
+@pytest.mark.parametrize("query, intent", [("hello there", "chitchat"), ("tell me a joke", "unsupported")])
+def test_chitchat_and_unsupported_short_circuit(graph, stubbed, query, intent):
+    from agents.intent_router import load_centroids
+
+    result = graph.invoke({"query": query})
+
+    assert result["intent"] == intent
+    assert result["final_answer"] == load_centroids().replies[intent]
+    assert stubbed.searches == [] and stubbed.generated == []
+
+
+def test_ungrounded_answer_is_regenerated_once(graph, stubbed, monkeypatch):
+    import agents.synthesizer as synthesizer
+    monkeypatch.setattr(synthesizer, "_generate", lambda prompt: "no citation here")
+
+    result = graph.invoke({"query": QUERY})
+
+    assert len(stubbed.regenerated) == 1
+    assert stubbed.regenerated[0].rstrip().endswith(QUERY)  # same prompt, query included
+    assert result["attempts"] == 2
+    assert result["final_answer"] == "Stub answer [wells_routing_c0]"
+    assert result["error"] is None
+
+
+def test_retry_cap_applies(graph, stubbed, monkeypatch):
+    import agents.synthesizer as synthesizer
+    monkeypatch.setattr(synthesizer, "_generate", lambda prompt: "no citation here")
+    monkeypatch.setattr(synthesizer, "regenerate", lambda prompt: "still no citation")
+
+    result = graph.invoke({"query": QUERY})
+
+    assert result["attempts"] == 2
+    assert result["final_answer"] is None
+    assert result["error"]
+
+
+def test_answer_streams_to_on_token(graph, stubbed):
+    pieces = []
+    result = graph.invoke({"query": QUERY, "on_token": pieces.append})
+
+    assert len(pieces) > 1
+    assert "".join(pieces) == result["final_answer"]
+
+
+def test_async_answer_streams_to_on_token(stubbed):
+    from main import build_graph
+
+    pieces = []
+    result = asyncio.run(build_graph(async_mode=True).ainvoke({"query": QUERY, "on_token": pieces.append}))
+
+    assert len(pieces) > 1
+    assert "".join(pieces) == result["final_answer"]
+
+
+def test_empty_scoped_search_widens_to_every_domain(graph, stubbed, monkeypatch):
+    import conftest
+    monkeypatch.setattr(conftest, "DOCS", [d for d in conftest.DOCS if d["domain"] != "wells"])
+
+    result = graph.invoke({"query": QUERY})
+
+    assert result["domain"] == "wells"
+    assert [s["filters"] is None for s in stubbed.searches] == [False, True]
+    assert result["retrieved_docs"]
+
+
+def test_unscoped_empty_search_runs_once(graph, stubbed, monkeypatch):
+    import agents.retrieval as retrieval
+    import conftest
+    monkeypatch.setattr(retrieval, "DOMAIN_FILTER", False)
+    monkeypatch.setattr(conftest, "DOCS", [])
+
+    result = graph.invoke({"query": QUERY})
+
+    assert result["domain"] == "wells" and result["retrieved_docs"] == []
+    assert len(stubbed.searches) == 1
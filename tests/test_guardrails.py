@@ -0,0 +1,39 @@
+import pytest
+
+from utils.guardrails import Guardrails, load_guardrails_cfg
+
+
+@pytest.fixture(scope="module")
+def guardrails():
+    return Guardrails(load_guardrails_cfg())
+
+
+@pytest.mark.parametrize("query, expected", [
+    ("email me at john.doe+x@wells.com please", "email me at [REDACTED_EMAIL] please"),
+    ("call (415) 555-0123", "call [REDACTED_PHONE]"),
+    ("ssn 123-45-6789", "ssn [REDACTED_SSN]"),
+    ("card 4111 1111 1111 1111", "card [REDACTED_CARD]"),
+    ("acct 12345678901", "acct [REDACTED_ACCOUNT]"),
+    ("VIN 50EA1GBA7NA000123", "VIN [REDACTED_VIN]"),
+    ("vin 50ea1gba7na000123", "vin [REDACTED_VIN]"),
+])
+def test_pii_is_redacted(guardrails, query, expected):
+    assert guardrails.apply(query) == expected
+
+
+@pytest.mark.parametrize("query", [
+    "What is routing number 121000248 used for?",  # ABA routing numbers are public
+    "Where is order 12345678?",
+    "How do I improve my skills?",
+    "What is the range of the Lucid Air?",
+])
+def test_domain_questions_pass_unchanged(guardrails, query):
+    assert guardrails.apply(query) == query
+
+
+@pytest.mark.parametrize("query, category", [
+    ("Killing time at the ATM", "violence"),
+    ("how to build a gun", "weapons"),
+])
+def test_blocklist(guardrails, query, category):
+    assert guardrails.check(query) == ("[BLOCKED_QUERY]", category, 0)
@@ -0,0 +1,146 @@
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import pytest
+
+pytest.importorskip("requests")
+
+ROBOTS = "User-agent: *\nDisallow: /private/\n"
+PAGE_DELAY = 0.05
+
+
+class Site(ThreadingHTTPServer):
+    """
+    Binary tree of pages: /docs/n<s> links to /docs/n<s>0, /docs/n<s>1 and a
+    robots-disallowed /private/n<s>. Records (path, time) of every page request.
+    """
+    daemon_threads = True
+
+    def __init__(self):
+        super().__init__(("127.0.0.1", 0), SiteHandler)
+        self.base = f"http://127.0.0.1:{self.server_address[1]}"
+        self.requests = []
+        self.in_flight = 0
+        self.peak_in_flight = 0
+        self.lock = threading.Lock()
+
+    @property
+    def pages(self):
+        return [path for path, _ in self.requests]
+
+
+class SiteHandler(BaseHTTPRequestHandler):
+    def do_GET(self):
+        site = self.server
+        if self.path == "/robots.txt":
+            return self._send("text/plain", ROBOTS)
+        with site.lock:
+            site.requests.append((self.path, time.monotonic()))
+            site.in_flight += 1
+            site.peak_in_flight = max(site.peak_in_flight, site.in_flight)
+        try:
+            time.sleep(PAGE_DELAY)
+            name = self.path.rsplit("/", 1)[-1]
+            links = "".join(f'<a href="/docs/{name}{i}">{name}{i}</a>' for i in "01")
+            self._send("text/html", f'<html><title>{name}</title><body>{links}'
+                                    f'<a href="/private/{name}">private</a></body></html>')
+        finally:
+            with site.lock:
+                site.in_flight -= 1
+
+    def _send(self, ctype, body):
+        data = body.encode()
+        self.send_response(200)
+        self.send_header("Content-Type", ctype)
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, *args):
+        pass
+
+
+@pytest.fixture
+def sites():
+    started = []
+
+    def start():
+        site = Site()
+        threading.Thread(target=site.serve_forever, daemon=True).start()
+        started.append(site)
+        return site
+    yield start
+    for site in started:
+        site.shutdown()
+        site.server_close()
+
+
+@pytest.fixture
+def crawl(tmp_path, monkeypatch):
+    """
+    Runs html_crawler.main() in tmp_path (every data/ path is relative) with
+    fresh per-host sessions and rate limiters.
+    """
+    yaml = pytest.importorskip("yaml")
+    import src.utils.helpers as helpers
+    from src.scraping import html_crawler
+
+    monkeypatch.chdir(tmp_path)
+    for key, value in helpers.CURRENT_CFG.items():
+        monkeypatch.setitem(helpers.CURRENT_CFG, key, value)
+    monkeypatch.setattr(helpers, "_BUCKETS", {})
+    monkeypatch.setattr(helpers, "_SESSIONS", {})
+
+    def run(sites, max_pages=100, max_depth=10, workers=4, throttle=0.0):
+        cfg = {
+            "crawler": {"throttle_seconds": throttle, "request_timeout": 5, "max_depth": max_depth,
+                        "max_pages": max_pages, "workers_per_host": workers},
+            "targets": [{"name": f"site{i}", "base": s.base, "allow_paths": ["/"],
+                         "start_urls": [f"{s.base}/docs/n"]} for i, s in enumerate(sites)],
+        }
+        (tmp_path / "crawler.yaml").write_text(yaml.safe_dump(cfg))
+        html_crawler.main(str(tmp_path / "crawler.yaml"), resume=False)
+    return run
+
+
+def test_max_pages_is_not_overshot_by_concurrent_workers(sites, crawl):
+    site = sites()
+    crawl([site], max_pages=5, workers=4)
+
+    assert len(site.pages) == 5
+    assert len(set(site.pages)) == 5
+    assert site.peak_in_flight > 1  # the workers really did fetch concurrently
+
+
+def test_max_depth_is_honored(sites, crawl):
+    site = sites()
+    crawl([site], max_depth=2)
+
+    # depth 0: n, depth 1: n0 n1, depth 2: n00 .. n11; nothing deeper
+    assert sorted(site.pages) == sorted(
+        f"/docs/{n}" for n in ["n", "n0", "n1", "n00", "n01", "n10", "n11"]
+    )
+
+
+def test_robots_disallow_is_respected(sites, crawl):
+    site = sites()
+    crawl([site], max_depth=3)
+
+    assert site.pages and not [p for p in site.pages if p.startswith("/private/")]
+
+
+def test_hosts_crawl_in_parallel_under_their_own_rate_limits(sites, crawl):
+    throttle = 0.2
+    a, b = sites(), sites()
+    crawl([a, b], max_pages=4, workers=2, throttle=throttle)
+
+    for site in (a, b):
+        times = sorted(t for _, t in site.requests)
+        assert len(times) == 4
+        # one token per `throttle` seconds per host, however many workers
+        assert min(y - x for x, y in zip(times, times[1:])) >= throttle * 0.9
+    # each host needs >= 3 * throttle; the two crawls overlap instead of queueing
+    first = [min(t for _, t in s.requests) for s in (a, b)]
+    last = [max(t for _, t in s.requests) for s in (a, b)]
+    assert max(first) < min(last)
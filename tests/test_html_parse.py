@@ -0,0 +1,38 @@
+import pytest
+
+PAGE = """<html><head><title>Routing numbers</title></head>
+<body><nav><a href="/home">Home</a></nav>
+<h1>Find your routing number</h1>
+<p>Your routing number is printed on your checks.</p>
+<a href="/zelle">Zelle</a>
+</body></html>"""
+
+XML_PAGE = '<?xml version="1.0" encoding="utf-8"?>\n' + PAGE
+
+
+@pytest.fixture
+def parse_cache(tmp_path, monkeypatch):
+    import utils.html_parse as html_parse
+    monkeypatch.setattr(html_parse, "PARSE_CACHE_DIR", str(tmp_path))
+    monkeypatch.setattr(html_parse, "_memory", type(html_parse._memory)())
+    return html_parse
+
+
+@pytest.mark.parametrize("html", [PAGE, XML_PAGE], ids=["html", "xml-declared"])
+def test_parse_extracts_title_text_and_links(parse_cache, html):
+    page = parse_cache.parse_html(html)
+
+    assert page.title == "Routing numbers"
+    assert page.headings == ["Find your routing number"]
+    assert "printed on your checks" in page.main_text
+    assert "Home" not in page.main_text  # layout tags dropped
+    assert page.hrefs == ["/home", "/zelle"]
+
+
+def test_xml_declared_page_is_cached_with_its_content(parse_cache):
+    parse_cache.parse_cached(XML_PAGE, "ab" * 32)
+    parse_cache._memory.clear()
+
+    page = parse_cache.load_parsed("ab" * 32)
+
+    assert page.title == "Routing numbers" and page.hrefs == ["/home", "/zelle"]
@@ -0,0 +1,82 @@
+import numpy as np
+import pytest
+
+WORDS = ["how", "do", "i", "reset", "my", "password", "routing", "number", "lucid", "air", "range", "charge"]
+TEXTS = ["how do i reset my password", "routing number", "lucid air range charge my air"]
+PAIRS = [("reset my password", "how do i reset my password"), ("lucid air range", "routing number")]
+
+
+@pytest.fixture
+def tiny_bert(tmp_path, monkeypatch):
+    """
+    Random 2-layer BERT cross-encoder + tokenizer saved locally, exported into
+    a per-test ONNX cache. Returns a factory: kind -> (model_dir, torch model).
+    """
+    torch = pytest.importorskip("torch")
+    pytest.importorskip("onnxruntime")
+    pytest.importorskip("onnx")
+    from transformers import BertConfig, BertForSequenceClassification, BertTokenizerFast
+
+    import models.onnx_backend as onnx_backend
+    monkeypatch.setattr(onnx_backend, "ONNX_CACHE_DIR", str(tmp_path / "onnx"))
+
+    vocab = tmp_path / "vocab.txt"
+    vocab.write_text("\n".join(["[PAD]", "[UNK]", "[CLS]", "[SEP]", "[MASK]"] + WORDS) + "\n")
+    torch.manual_seed(0)
+    config = BertConfig(
+        vocab_size=5 + len(WORDS), hidden_size=32, num_hidden_layers=2, num_attention_heads=2,
+        intermediate_size=64, max_position_embeddings=64, num_labels=1, initializer_range=0.2,
+    )
+
+    def build(kind):
+        model_dir = tmp_path / kind  # one dir per kind: the ONNX cache is keyed by model id
+        model = BertForSequenceClassification(config).eval()
+        model.save_pretrained(model_dir)
+        BertTokenizerFast(vocab_file=str(vocab)).save_pretrained(model_dir)
+        return str(model_dir), model
+    return build
+
+
+def test_export_follows_forward_argument_order(tiny_bert):
+    from models.onnx_backend import FORWARD_INPUTS, OnnxEmbedder
+
+    model_dir, _ = tiny_bert("embedding")
+    names = [i.name for i in OnnxEmbedder(model_dir).session.get_inputs()]
+
+    assert names == list(FORWARD_INPUTS)
+
+
+def test_onnx_embeddings_match_torch(tiny_bert):
+    import torch
+    from models.onnx_backend import OnnxEmbedder
+
+    model_dir, model = tiny_bert("embedding")
+    onnx = OnnxEmbedder(model_dir)
+
+    # padded batch: the shorter texts only come out right if the mask is applied
+    enc = onnx.tokenizer(TEXTS, padding=True, return_tensors="pt")
+    with torch.no_grad():
+        hidden = model.bert(**enc).last_hidden_state
+    mask = enc["attention_mask"][..., None].float()
+    ref = ((hidden * mask).sum(1) / mask.sum(1)).numpy()
+    ref /= np.linalg.norm(ref, axis=1, keepdims=True)
+
+    got = onnx.encode(TEXTS, normalize_embeddings=True)
+
+    assert (ref * got).sum(axis=1).min() >= 0.99
+
+
+def test_onnx_reranker_matches_torch(tiny_bert):
+    import torch
+    from models.onnx_backend import OnnxCrossEncoder
+
+    model_dir, model = tiny_bert("reranker")
+    onnx = OnnxCrossEncoder(model_dir)
+
+    enc = onnx.tokenizer([q for q, _ in PAIRS], [p for _, p in PAIRS], padding=True, return_tensors="pt")
+    with torch.no_grad():
+        ref = torch.sigmoid(model(**enc).logits[:, 0]).numpy()
+
+    got = onnx.predict(PAIRS)
+
+    assert np.abs(ref - got).max() <= 0.05
@@ -0,0 +1,25 @@
+import pytest
+
+
+def _cands(scores):
+    return [{"doc_id": f"c{i}", "retrieval_score": s} for i, s in enumerate(scores)]
+
+
+@pytest.mark.parametrize("scale", [1.0, 0.05, 0.5], ids=["bm25", "hybrid", "vector"])
+def test_adaptive_pool_does_not_depend_on_score_scale(scale):
+    from agents.rerank import _select_pool
+
+    # BM25-sized scores: top-2 gap 2.5 (> 0.3), but small against the 18-point range
+    close = _cands([s * scale for s in (20.0, 17.5, 16.0, 13.0, 2.0)])
+    pool, skipped = _select_pool(close, top_k=2)
+    assert not skipped and [c["doc_id"] for c in pool] == ["c0", "c1", "c2", "c3"]
+
+    clear = _cands([s * scale for s in (20.0, 9.0, 8.0, 2.0)])
+    assert _select_pool(clear, top_k=2) == ([], True)
+
+
+def test_adaptive_pool_reranks_ties_and_pairs():
+    from agents.rerank import _select_pool
+
+    assert _select_pool(_cands([3.0, 3.0, 3.0]), top_k=1)[0] == _cands([3.0, 3.0, 3.0])
+    assert _select_pool(_cands([30.0, 1.0]), top_k=1) == (_cands([30.0, 1.0]), False)